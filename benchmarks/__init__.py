@@ -0,0 +1,106 @@
+"""
+Microbenchmarks for the exporter's hot helpers, run by run_benchmarks.py.
+
+A benchmark is a setup function decorated with @benchmark. It builds its
+input data and returns the callable to time, so only that is measured:
+
+    @benchmark()
+    def float_to_str_10k():
+        values = [...]
+        return lambda: [floatToStr(v) for v in values]
+
+Benchmarks using mathutils or bpy need needs_blender=True,
+they're run in blender -b and skipped everywhere else
+"""
+import dataclasses
+import gc
+import importlib
+import pkgutil
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+
+@dataclasses.dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], object]]
+    needs_blender: bool
+
+
+@dataclasses.dataclass
+class BenchmarkResult:
+    name: str
+    ops_per_sec: float
+    # Most memory allocated at once during one call, as seen by tracemalloc
+    peak_alloc_bytes: int
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:<40} {self.ops_per_sec:>14,.1f} ops/sec"
+            f" {self.peak_alloc_bytes / 1024:>12,.1f} KiB peak"
+        )
+
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(needs_blender: bool = False):
+    """Registers the decorated setup function under its name"""
+
+    def register(setup: Callable[[], Callable[[], object]]):
+        BENCHMARKS[setup.__name__] = Benchmark(setup.__name__, setup, needs_blender)
+        return setup
+
+    return register
+
+
+def load_all() -> None:
+    """Imports every bench_*.py module next to this one, registering its benchmarks"""
+    for module_info in pkgutil.iter_modules(__path__):
+        if module_info.name.startswith("bench_"):
+            importlib.import_module(f"{__name__}.{module_info.name}")
+
+
+def run_benchmark(bench: Benchmark, repeat: int = 10) -> BenchmarkResult:
+    """
+    Times bench's callable with timeit's autorange, keeping the best of repeat
+    runs, then measures the allocations of one more call
+    """
+    func = bench.setup()
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return BenchmarkResult(bench.name, number / best, peak)
+
+
+def compare(
+    result: BenchmarkResult, baseline: Optional[Dict[str, float]], tolerance: float
+) -> str:
+    """
+    How result's ops/sec compares to baseline's, "" if there's no baseline for it.
+    Slower by more than tolerance (0.1 is 10%) is a REGRESSION
+    """
+    if not baseline or not baseline.get("ops_per_sec"):
+        return ""
+    ratio = result.ops_per_sec / baseline["ops_per_sec"]
+    verdict = "REGRESSION" if ratio < 1 - tolerance else "ok"
+    return f"{ratio:.2f}x baseline {verdict}"
+
+
+def to_json_dict(results: List[BenchmarkResult]) -> Dict[str, Dict[str, float]]:
+    return {
+        result.name: {
+            "ops_per_sec": result.ops_per_sec,
+            "peak_alloc_bytes": result.peak_alloc_bytes,
+        }
+        for result in results
+    }
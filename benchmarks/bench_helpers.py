@@ -0,0 +1,30 @@
+"""Benchmarks for forest_helpers' mathutils helpers, these need Blender"""
+import random
+
+from benchmarks import benchmark
+
+
+def _make_vectors(count: int, seed: int = 0):
+    import mathutils
+
+    rng = random.Random(seed)
+    return [
+        mathutils.Vector((rng.gauss(0, 5), rng.gauss(0, 5), rng.gauss(0, 5)))
+        for _ in range(count)
+    ]
+
+
+@benchmark(needs_blender=True)
+def round_vec_10k():
+    from io_scene_xplane_for import forest_helpers
+
+    vectors = _make_vectors(10_000)
+    return lambda: [forest_helpers.round_vec(v) for v in vectors]
+
+
+@benchmark(needs_blender=True)
+def vec_b_to_x_10k():
+    from io_scene_xplane_for import forest_helpers
+
+    vectors = _make_vectors(10_000)
+    return lambda: [forest_helpers.vec_b_to_x(v) for v in vectors]
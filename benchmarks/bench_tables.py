@@ -0,0 +1,57 @@
+"""Benchmarks for forest_tables, on a synthetic mesh made in Blender"""
+
+from benchmarks import benchmark
+
+
+def _make_grid_object(side: int):
+    """A side x side vertex grid of quads, with UVs, linked to the scene"""
+    import bpy
+    import numpy
+
+    xs, ys = numpy.meshgrid(numpy.arange(side), numpy.arange(side))
+    vertices = numpy.column_stack(
+        (xs.ravel(), ys.ravel(), numpy.sin(xs.ravel() + ys.ravel()))
+    )
+    corners = (ys[:-1, :-1] * side + xs[:-1, :-1]).ravel()
+    faces = numpy.column_stack(
+        (corners, corners + 1, corners + side + 1, corners + side)
+    )
+
+    mesh = bpy.data.meshes.new("bench_grid")
+    mesh.from_pydata(vertices.tolist(), [], faces.tolist())
+    uv_layer = mesh.uv_layers.new()
+    loop_vertices = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+    mesh.loops.foreach_get("vertex_index", loop_vertices)
+    uvs = vertices[loop_vertices, :2] / (side - 1)
+    uv_layer.data.foreach_set("uv", uvs.ravel())
+    obj = bpy.data.objects.new("bench_grid", mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    bpy.context.view_layer.update()
+    return obj
+
+
+def _collect_mesh_table(mesh_engine: str):
+    from io_scene_xplane_for import forest_context, forest_tables
+
+    obj = _make_grid_object(317)  # 100,489 vertices
+
+    def collect():
+        # A new context each time, so nothing evaluated is reused between calls
+        with forest_context.ExportContext(mesh_engine=mesh_engine) as export_context:
+            forest_tables.collect_mesh_table(obj, export_context)
+
+    return collect
+
+
+@benchmark(needs_blender=True)
+def collect_mesh_table_python_100k():
+    from io_scene_xplane_for import forest_constants
+
+    return _collect_mesh_table(forest_constants.MESH_ENGINE_PYTHON)
+
+
+@benchmark(needs_blender=True)
+def collect_mesh_table_numpy_100k():
+    from io_scene_xplane_for import forest_constants
+
+    return _collect_mesh_table(forest_constants.MESH_ENGINE_NUMPY)
@@ -0,0 +1,75 @@
+"""Benchmarks for forest_writer, on synthetic data so they don't need Blender"""
+import io
+
+import numpy
+
+from benchmarks import benchmark
+from io_scene_xplane_for import forest_ir, forest_writer
+
+
+class _NullSink(io.TextIOBase):
+    def write(self, text: str) -> int:
+        return len(text)
+
+
+def _make_mesh(vertex_count: int, seed: int = 0) -> forest_ir.MeshIR:
+    """A mesh table whose values repeat roughly like a real tree's do"""
+    rng = numpy.random.default_rng(seed)
+    vertices = numpy.empty((vertex_count, 11), dtype=numpy.float32)
+    vertices[:, 0:3] = numpy.round(rng.normal(scale=5, size=(vertex_count, 3)), 4)
+    vertices[:, 3:6] = rng.choice([0.0, 1.0, -1.0, 0.7071068], size=(vertex_count, 3))
+    vertices[:, 6:8] = numpy.round(rng.random(size=(vertex_count, 2)), 5)
+    vertices[:, 8:11] = 0
+    indices = rng.integers(0, vertex_count, size=vertex_count * 3, dtype=numpy.int32)
+    return forest_ir.MeshIR(
+        name="Synthetic",
+        lod_near=0,
+        lod_far=500,
+        wind_bend_ratio=1.0,
+        branch_stiffness=1.0,
+        wind_speed=10.0,
+        no_shadow=False,
+        vertices=vertices,
+        indices=indices,
+    )
+
+
+def _write_mesh(mesh: forest_ir.MeshIR) -> None:
+    with forest_writer.ForestWriter(_NullSink()) as writer:
+        forest_writer.write_mesh(writer, mesh)
+
+
+@benchmark()
+def float_to_str_10k():
+    values = (
+        numpy.random.default_rng(0).normal(size=10_000).astype(numpy.float32).tolist()
+    )
+    return lambda: [forest_writer.floatToStr(value) for value in values]
+
+
+@benchmark()
+def floats_to_strs_10k():
+    values = numpy.random.default_rng(0).normal(size=10_000).astype(numpy.float32)
+    return lambda: forest_writer.floats_to_strs(values)
+
+
+@benchmark()
+def vertex_rows_1k():
+    """VERTEX lines only, from an empty IDX table"""
+    mesh = _make_mesh(1_000)
+    mesh.indices = mesh.indices[:0]
+    return lambda: _write_mesh(mesh)
+
+
+@benchmark()
+def idx_chunking_30k():
+    """IDX lines only, from an empty VERTEX table"""
+    mesh = _make_mesh(10_000)
+    mesh.vertices = mesh.vertices[:0]
+    return lambda: _write_mesh(mesh)
+
+
+@benchmark()
+def write_mesh_table_100k():
+    mesh = _make_mesh(100_000)
+    return lambda: _write_mesh(mesh)
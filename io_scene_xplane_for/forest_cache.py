@@ -0,0 +1,191 @@
+"""
+Caches for work that can be shared between all the .for files of one export,
+and optionally between exports
+"""
+import collections
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from typing import Dict, Hashable, Optional
+
+import numpy
+
+from io_scene_xplane_for import forest_ir
+from io_scene_xplane_for.forest_logger import MessageCodes, logger
+
+# Change this whenever what's collected for a MESH table changes for the same mesh,
+# so tables saved by older versions of the exporter are never reused
+_DISK_FORMAT_VERSION = 2
+
+# The MeshIR fields saved next to its vertices and indices
+_DISK_MESH_FIELDS = (
+    "name",
+    "lod_near",
+    "lod_far",
+    "wind_bend_ratio",
+    "branch_stiffness",
+    "wind_speed",
+    "no_shadow",
+)
+
+
+class MeshTableCache:
+    """
+    A least recently used cache of collected 3D meshes (forest_ir.MeshIR),
+    shared by every ForestFile in an export so a mesh used by many forests
+    is only triangulated once, and formatted once.
+
+    Keys are made by forest_tables.collect_mesh_table from the mesh's name and
+    the content of its evaluated geometry and settings. max_size is the total
+    size in bytes of all cached vertex tables and formatted tables,
+    past that the least recently used are evicted.
+
+    If cache_dir is given, vertex tables are also kept there between Blender
+    sessions. Since keys only depend on content, an unchanged mesh is never rebuilt
+    """
+
+    def __init__(
+        self, max_size: int = 256 * 1024 * 1024, cache_dir: Optional[str] = None
+    ):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._meshes: "collections.OrderedDict[Hashable, forest_ir.MeshIR]" = (
+            collections.OrderedDict()
+        )
+        # The size of each cached mesh when it was last measured, and their total
+        self._sizes: Dict[Hashable, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._meshes)
+
+    def get(self, key: Hashable) -> Optional[forest_ir.MeshIR]:
+        try:
+            mesh = self._meshes[key]
+        except KeyError:
+            pass
+        else:
+            self._meshes.move_to_end(key)
+            self.hits += 1
+            return mesh
+
+        mesh = self._read_from_disk(key)
+        if mesh is None:
+            self.misses += 1
+        else:
+            self.disk_hits += 1
+            self._remember(key, mesh)
+        return mesh
+
+    def put(self, key: Hashable, mesh: forest_ir.MeshIR) -> None:
+        self._remember(key, mesh)
+        self._write_to_disk(key, mesh)
+
+    def clear(self) -> None:
+        """Forgets the meshes kept in memory, the cache folder is untouched"""
+        self._meshes.clear()
+        self._sizes.clear()
+        self._size = 0
+
+    @staticmethod
+    def _size_of(mesh: forest_ir.MeshIR) -> int:
+        return mesh.vertices.nbytes + mesh.indices.nbytes + len(mesh.table or "")
+
+    def _remember(self, key: Hashable, mesh: forest_ir.MeshIR) -> None:
+        mesh.shared = True
+        # Formatted tables are added to meshes after they're cached
+        mesh.on_table = functools.partial(self._resize, key)
+        self._meshes[key] = mesh
+        self._meshes.move_to_end(key)
+        self._resize(key, mesh)
+
+    def _resize(self, key: Hashable, mesh: forest_ir.MeshIR) -> None:
+        """
+        Measures mesh again, when it's cached or gets its formatted table,
+        then evicts the least recently used meshes until the cache fits
+        """
+        if self._meshes.get(key) is not mesh:
+            return
+        size = self._size_of(mesh)
+        self._size += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        while self._size > self.max_size:
+            evicted_key, evicted = self._meshes.popitem(last=False)
+            evicted.on_table = None
+            self._size -= self._sizes.pop(evicted_key)
+
+    def _disk_path(self, key: Hashable) -> str:
+        file_name = hashlib.blake2b(
+            repr((_DISK_FORMAT_VERSION, key)).encode(), digest_size=20
+        ).hexdigest()
+        return os.path.join(self.cache_dir, file_name[:2], file_name + ".npz")
+
+    def _read_from_disk(self, key: Hashable) -> Optional[forest_ir.MeshIR]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with numpy.load(path, allow_pickle=False) as saved:
+                return forest_ir.MeshIR(
+                    **json.loads(str(saved["fields"])),
+                    vertices=saved["vertices"],
+                    indices=saved["indices"],
+                )
+        except FileNotFoundError:
+            return None
+        except (
+            OSError,
+            KeyError,
+            ValueError,
+            TypeError,
+            EOFError,
+            zipfile.BadZipFile,
+        ) as e:
+            logger.warn(
+                MessageCodes.W000,
+                f"Could not read from mesh cache folder '{self.cache_dir}': {e}",
+                None,
+            )
+            # A truncated or corrupt entry, so _write_to_disk can replace it
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _write_to_disk(self, key: Hashable, mesh: forest_ir.MeshIR) -> None:
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written to a temporary file first so another export
+            # never reads a half written table
+            with tempfile.NamedTemporaryFile(
+                "wb", dir=os.path.dirname(path), suffix=".tmp", delete=False
+            ) as tmp_file:
+                numpy.savez(
+                    tmp_file,
+                    fields=numpy.array(
+                        json.dumps(
+                            {field: getattr(mesh, field) for field in _DISK_MESH_FIELDS}
+                        )
+                    ),
+                    vertices=mesh.vertices,
+                    indices=mesh.indices,
+                )
+            os.replace(tmp_file.name, path)
+        except OSError as e:
+            logger.warn(
+                MessageCodes.W000,
+                f"Could not write to mesh cache folder '{self.cache_dir}': {e}",
+                None,
+            )
@@ -14,6 +14,15 @@ PRECISION_KEYFRAME = 5
 # to an OBJ file
 PRECISION_OBJ_FLOAT = 8
 
+# How collect_mesh_table builds a MESH table. Both engines
+# must produce byte for byte identical output
+MESH_ENGINE_PYTHON = "PYTHON"
+MESH_ENGINE_NUMPY = "NUMPY"
+
+# Vertex groups that give 3D mesh vertices their wind weights,
+# in the order they are written in VERTEX
+WIND_WEIGHT_GROUPS = ("w_stiffness", "w_edge_stiffness", "w_phase")
+
 SURFACE_TYPE_ASPHALT = "asphalt"
 SURFACE_TYPE_BLASTPAD = "blastpad"
 SURFACE_TYPE_CONCRETE = "concrete"
@@ -0,0 +1,265 @@
+"""
+What's shared by the collection of every forest in one export,
+made once instead of once per tree or per object
+"""
+import operator
+import os
+import pathlib
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import bpy
+import numpy
+
+from io_scene_xplane_for import (
+    forest_cache,
+    forest_constants,
+    forest_helpers,
+    forest_images,
+    forest_profiler,
+    forest_snapshots,
+)
+from io_scene_xplane_for.forest_logger import MessageCodes, logger
+
+
+class ExportContext:
+    """
+    Holds the export's evaluated depsgraph, visibility and children indexes,
+    and each object's evaluated mesh and vertex arrays once they're first asked for,
+    so modifiers are evaluated once per object per export.
+    Snapshots of .for settings are likewise read once per datablock.
+
+    Meshes are only valid until free is called,
+    use it as a context manager to free them when collection is done:
+
+        with ExportContext() as export_context:
+            forest_files = create_potential_forest_files(export_context)
+
+    mesh_engine is one of forest_constants.MESH_ENGINE_*,
+    mesh_table_cache can be shared between exports,
+    profiler times the phases of collection
+    """
+
+    def __init__(
+        self,
+        mesh_engine: str = forest_constants.MESH_ENGINE_PYTHON,
+        mesh_table_cache: Optional[forest_cache.MeshTableCache] = None,
+        depsgraph: Optional[bpy.types.Depsgraph] = None,
+        view_layer: Optional[bpy.types.ViewLayer] = None,
+        profiler: Optional[forest_profiler.Profiler] = None,
+    ):
+        self.mesh_engine = mesh_engine
+        # Disabled unless one is given
+        self.profiler = profiler or forest_profiler.Profiler(enabled=False)
+        self.mesh_table_cache = mesh_table_cache
+        self.depsgraph = depsgraph or bpy.context.evaluated_depsgraph_get()
+        self.visibility_index = forest_helpers.VisibilityIndex(
+            view_layer or bpy.context.view_layer
+        )
+        self.children_index = forest_helpers.ChildrenIndex()
+        # Keyed by object name
+        self._evaluated_objects: Dict[str, bpy.types.Object] = {}
+        self._meshes: Dict[str, bpy.types.Mesh] = {}
+        # Keyed by object name and world
+        self._coordinates: Dict[Tuple[str, bool], numpy.ndarray] = {}
+        self._edge_vertices: Dict[str, numpy.ndarray] = {}
+        # Shared by linked duplicates, see forest_tree.ForestTree
+        self.child_kinds: Dict[Hashable, str] = {}
+        self.uv_rects: Dict[Hashable, Tuple[int, int, int, int]] = {}
+        # Keyed by normalized absolute path, made when first needed.
+        # None if the file is missing
+        self._images_by_path: Optional[Dict[str, Optional[bpy.types.Image]]] = None
+        # Keyed by texture path as written in the material, None if it's missing
+        self._texture_images: Dict[str, Optional[bpy.types.Image]] = {}
+        self._texture_sizes: Dict[str, Optional[Tuple[int, int]]] = {}
+        # Keyed by snapshot class and datablock name
+        self._settings: Dict[Tuple[type, str], Any] = {}
+
+    def __enter__(self) -> "ExportContext":
+        return self
+
+    def __exit__(self, exc_type, value, traceback) -> None:
+        self.free()
+
+    def get_evaluated_object(self, obj: bpy.types.Object) -> bpy.types.Object:
+        try:
+            return self._evaluated_objects[obj.name]
+        except KeyError:
+            object_eval = self._evaluated_objects[obj.name] = obj.evaluated_get(
+                self.depsgraph
+            )
+            return object_eval
+
+    def get_evaluated_mesh(self, obj: bpy.types.Object) -> bpy.types.Mesh:
+        """
+        The mesh of obj with its modifiers applied, in object space.
+        Don't call to_mesh_clear on it, free does that
+        """
+        try:
+            return self._meshes[obj.name]
+        except KeyError:
+            mesh = self._meshes[obj.name] = self.get_evaluated_object(obj).to_mesh(
+                preserve_all_data_layers=False, depsgraph=self.depsgraph
+            )
+            return mesh
+
+    def get_vertex_coordinates(
+        self, obj: bpy.types.Object, world: bool = False
+    ) -> numpy.ndarray:
+        """
+        A (n, 3) float32 array of obj's evaluated vertex coordinates,
+        in object space or, if world, transformed into world space.
+        Don't change it
+        """
+        key = (obj.name, world)
+        try:
+            return self._coordinates[key]
+        except KeyError:
+            pass
+
+        if world:
+            matrix = numpy.array(
+                self.get_evaluated_object(obj).matrix_world, dtype=numpy.float32
+            )
+            coordinates = (
+                self.get_vertex_coordinates(obj) @ matrix[:3, :3].T + matrix[:3, 3]
+            )
+        else:
+            mesh = self.get_evaluated_mesh(obj)
+            coordinates = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+            mesh.vertices.foreach_get("co", coordinates)
+            coordinates = coordinates.reshape(-1, 3)
+        self._coordinates[key] = coordinates
+        return coordinates
+
+    def get_edge_vertices(self, obj: bpy.types.Object) -> numpy.ndarray:
+        """
+        A (n, 2) int32 array of the vertex indices of obj's evaluated edges.
+        Don't change it
+        """
+        try:
+            return self._edge_vertices[obj.name]
+        except KeyError:
+            mesh = self.get_evaluated_mesh(obj)
+            edge_vertices = numpy.empty(len(mesh.edges) * 2, dtype=numpy.int32)
+            mesh.edges.foreach_get("vertices", edge_vertices)
+            edge_vertices = self._edge_vertices[obj.name] = edge_vertices.reshape(
+                -1, 2
+            )
+            return edge_vertices
+
+    def get_forest_settings(
+        self, collection: bpy.types.Collection
+    ) -> forest_snapshots.ForestSettings:
+        return self._get_settings(
+            forest_snapshots.ForestSettings, collection, "xplane_for.forest"
+        )
+
+    def get_tree_settings(
+        self, tree_container: bpy.types.Object
+    ) -> forest_snapshots.TreeSettings:
+        return self._get_settings(
+            forest_snapshots.TreeSettings, tree_container, "xplane_for.tree"
+        )
+
+    def get_material_settings(
+        self, material: bpy.types.Material
+    ) -> forest_snapshots.MaterialSettings:
+        return self._get_settings(
+            forest_snapshots.MaterialSettings, material, "xplane_for"
+        )
+
+    def get_mesh_settings(self, mesh: bpy.types.Mesh) -> forest_snapshots.MeshSettings:
+        return self._get_settings(forest_snapshots.MeshSettings, mesh, "xplane_for")
+
+    def _get_settings(self, snapshot_class: type, datablock: bpy.types.ID, path: str):
+        """
+        A snapshot_class of datablock's property group at path,
+        made the first time it's asked for in this export
+        """
+        key = (snapshot_class, datablock.name)
+        try:
+            return self._settings[key]
+        except KeyError:
+            settings = self._settings[key] = snapshot_class(
+                operator.attrgetter(path)(datablock)
+            )
+            return settings
+
+    def get_texture_size(
+        self, texture_path: str, problem_datablock: bpy.types.ID
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Returns the (width, height) of the image at texture_path,
+        or None if the file can't be found.
+
+        PNG and DDS sizes come from the file's header, other formats
+        and images not on disk go through get_texture_image
+        """
+        try:
+            return self._texture_sizes[texture_path]
+        except KeyError:
+            pass
+
+        size = forest_images.get_image_size(bpy.path.abspath(texture_path))
+        if not size:
+            image = self.get_texture_image(texture_path, problem_datablock)
+            size = tuple(image.size) if image else None
+        self._texture_sizes[texture_path] = size
+        return size
+
+    def get_texture_image(
+        self, texture_path: str, problem_datablock: bpy.types.ID
+    ) -> Optional[bpy.types.Image]:
+        """
+        Returns the image whose file is at texture_path, loading it if
+        it's not in bpy.data.images yet, or None if the file can't be found.
+
+        A missing file is reported (with problem_datablock) only the first time
+        """
+        try:
+            return self._texture_images[texture_path]
+        except KeyError:
+            pass
+
+        if self._images_by_path is None:
+            self._images_by_path = {}
+            for image in bpy.data.images:
+                self._images_by_path.setdefault(
+                    _normalize_path(image.filepath), image
+                )
+
+        normalized_path = _normalize_path(texture_path)
+        try:
+            image = self._images_by_path[normalized_path]
+        except KeyError:
+            image = bpy.data.images.new(
+                pathlib.Path(bpy.path.abspath(texture_path)).stem, width=0, height=0,
+            )
+            image.source = "FILE"
+            image.filepath = texture_path
+            self._images_by_path[normalized_path] = image
+
+        if image and image.size[:] == (0, 0):
+            logger.error(
+                MessageCodes.E012,
+                f"Image at '{texture_path}' could not be found",
+                problem_datablock,
+            )
+            bpy.data.images.remove(image)
+            image = self._images_by_path[normalized_path] = None
+
+        self._texture_images[texture_path] = image
+        return image
+
+    def free(self) -> None:
+        """Frees every evaluated mesh and array made so far"""
+        self._coordinates.clear()
+        self._edge_vertices.clear()
+        for name in self._meshes:
+            self._evaluated_objects[name].to_mesh_clear()
+        self._meshes.clear()
+        self._evaluated_objects.clear()
+
+
+def _normalize_path(path: str) -> str:
+    return os.path.normcase(os.path.normpath(bpy.path.abspath(path)))
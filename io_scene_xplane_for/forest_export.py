@@ -1,18 +1,29 @@
 """The starting point for the export process, the start of the addon"""
 
+import concurrent.futures
 import os
 import os.path
 import sys
 
 # from .xplane_config import getDebug
 # from .xplane_helpers import XPlaneLogger, logger
-from typing import IO, Any, List, Optional
+from typing import IO, Any, Dict, List, Optional, Union
 
 import bpy
 import mathutils
 from bpy_extras.io_utils import ExportHelper, ImportHelper
 
-from io_scene_xplane_for import forest_file, forest_helpers, forest_logger, forest_tree
+from io_scene_xplane_for import (
+    forest_cache,
+    forest_constants,
+    forest_context,
+    forest_file,
+    forest_helpers,
+    forest_logger,
+    forest_profiler,
+    forest_tree,
+    forest_writer,
+)
 from io_scene_xplane_for.forest_logger import MessageCodes, logger
 
 
@@ -31,26 +42,182 @@ class EXPORT_OT_XPlaneFor(bpy.types.Operator, ExportHelper):
         default="",
     )
 
+    mesh_engine: bpy.props.EnumProperty(
+        name="Mesh Engine",
+        description="How 3D mesh tables are built, all engines write identical files",
+        items=(
+            (
+                forest_constants.MESH_ENGINE_PYTHON,
+                "Python",
+                "Builds mesh tables one triangle at a time",
+            ),
+            (
+                forest_constants.MESH_ENGINE_NUMPY,
+                "NumPy",
+                "Builds mesh tables in bulk with NumPy, faster for large meshes",
+            ),
+        ),
+        default=forest_constants.MESH_ENGINE_PYTHON,
+    )
+
+    mesh_cache_dir: bpy.props.StringProperty(
+        name="Mesh Cache Folder",
+        description="If set, finished mesh tables are kept here and reused by later exports of unchanged meshes",
+        default="",
+        subtype="DIR_PATH",
+    )
+
+    incremental: bpy.props.BoolProperty(
+        name="Skip Unchanged Files",
+        description="Don't rewrite .for files whose content would stay the same, keeping their modification time",
+        default=False,
+    )
+
+    use_process_pool: bpy.props.BoolProperty(
+        name="Write In Parallel",
+        description="Write .for files in separate processes, faster when exporting many forests",
+        default=False,
+    )
+
+    max_workers: bpy.props.IntProperty(
+        name="Max Processes",
+        description="How many .for files are written at once, 0 uses every CPU core",
+        default=0,
+        min=0,
+    )
+
+    log_debug: bpy.props.BoolProperty(
+        name="Log Debug Messages",
+        description="Also log what each tree and mesh is collected as, one message per object. Slow for big forests",
+        default=False,
+    )
+
+    log_file: bpy.props.StringProperty(
+        name="Log File",
+        description="If set, every message logged is also written here as JSON lines, from a background thread",
+        default="",
+        subtype="FILE_PATH",
+    )
+
+    write_profile: bpy.props.BoolProperty(
+        name="Write Profile Report",
+        description="Write how long each phase of the export took, per forest and per mesh, to forest_export_profile.json next to the .for files",
+        default=False,
+    )
+
+    profile_memory: bpy.props.BoolProperty(
+        name="Profile Memory",
+        description="Also record each phase's peak memory use in the profile report, this slows the export down",
+        default=False,
+    )
+
+    use_cprofile: bpy.props.BoolProperty(
+        name="Capture cProfile",
+        description="Also capture the whole export with cProfile, to forest_export_profile.prof next to the .for files. Setting the XPLANE_FOR_CPROFILE environment variable to 1 does the same",
+        default=False,
+    )
+
     def execute(self, context):
-        debug = True
-        dry_run = False
         continue_on_error = False
         # self._startLogging()
-        logger.reset()
+        logger.reset(
+            msg_types=list(forest_logger.MessageTypes) if self.log_debug else None
+        )
         logger.transports.append(forest_logger.ForestLogger.InternalTextTransport())
+        log_file_transport = None
+        if self.log_file:
+            try:
+                log_file_transport = forest_logger.ForestLogger.JSONLinesTransport(
+                    bpy.path.abspath(self.log_file)
+                )
+            except OSError as e:
+                logger.warn(
+                    MessageCodes.W003,
+                    f"Could not open the log file '{self.log_file}': {e.strerror or e}",
+                    None,
+                )
+            else:
+                logger.transports.append(log_file_transport)
+        # Shared so forests using the same meshes only make their tables once
+        mesh_table_cache = forest_cache.MeshTableCache(
+            cache_dir=bpy.path.abspath(self.mesh_cache_dir)
+            if self.mesh_cache_dir
+            else None
+        )
+        profiler = forest_profiler.Profiler(
+            enabled=self.write_profile
+            or self.profile_memory
+            or self.use_cprofile
+            or forest_profiler.cprofile_requested(),
+            trace_memory=self.profile_memory,
+            use_cprofile=self.use_cprofile,
+        )
+        profiler.start()
+        try:
+            return self._export(mesh_table_cache, profiler)
+        finally:
+            profiler.stop()
+            self._write_profile(profiler)
+            logger.warn_dropped()
+            if log_file_transport:
+                # Closed, it mustn't be flushed by the next export's logger.reset
+                if log_file_transport in logger.transports:
+                    logger.transports.remove(log_file_transport)
+                try:
+                    log_file_transport.close()
+                except OSError as e:
+                    logger.warn(
+                        MessageCodes.W003,
+                        f"Could not write the log file '{self.log_file}': {e.strerror or e}",
+                        None,
+                    )
+            logger.flush()
+
+    def _get_output_dir(self) -> str:
+        """
+        Where .for files are written, the export's filepath or else
+        the .blend file's folder
+        """
+        if self.filepath:
+            return os.path.abspath(self.filepath)
+        else:
+            return os.path.abspath(os.path.dirname(bpy.context.blend_data.filepath))
+
+    def _write_profile(self, profiler: forest_profiler.Profiler) -> None:
+        if not profiler.enabled:
+            return
+        report_path = os.path.join(self._get_output_dir(), "forest_export_profile")
+        try:
+            if self.write_profile or self.profile_memory:
+                profiler.write_report(report_path + ".json")
+                self.report({"INFO"}, f"Wrote profile report to '{report_path}.json'")
+            if profiler.write_cprofile(report_path + ".prof"):
+                self.report({"INFO"}, f"Wrote cProfile capture to '{report_path}.prof'")
+        except OSError as e:
+            logger.warn(
+                MessageCodes.W002,
+                f"Could not write the profile report '{report_path}': {e.strerror or e}",
+                None,
+            )
+
+    def _export(
+        self,
+        mesh_table_cache: forest_cache.MeshTableCache,
+        profiler: forest_profiler.Profiler,
+    ):
+        dry_run = False
         # --- collect ---
-        forest_files = forest_file.create_potential_forest_files()
+        with forest_context.ExportContext(
+            self.mesh_engine, mesh_table_cache, profiler=profiler
+        ) as export_context:
+            forest_files = forest_file.create_potential_forest_files(export_context)
+        logger.flush()
         # ---------------
 
         # --- write -----
-        def write_to_disk(forest_file) -> None:
-            o = forest_file.write()
-            if debug:
-                #print("---", o, "---", sep="\n")
-                pass
+
+        def get_final_path(forest_file) -> str:
             file_name = bpy.path.ensure_ext(forest_file.file_name, ".for")
-            if logger.errors:
-                return
             blend_path = bpy.context.blend_data.filepath
             if self.filepath:
                 final_path = os.path.abspath(os.path.join(self.filepath, file_name))
@@ -60,36 +227,91 @@ class EXPORT_OT_XPlaneFor(bpy.types.Operator, ExportHelper):
                 )
 
             assert final_path.endswith(".for")
-            try:
-                os.makedirs(os.path.dirname(final_path), exist_ok=True)
-            except OSError as e:
-                logger.error(e)
-                raise
-            else:
-                if not dry_run:
-                    with open(final_path, "w") as f:
-                        f.write(o)
-                else:
-                    logger.info(
-                        MessageCodes.I000,
-                        "Not writing '{final_path}' due to dry run",
-                        None,
-                    )
+            return final_path
+
+        # (forest, path) of each .for file to write
+        jobs = (
+            [(ff.ir, get_final_path(ff)) for ff in forest_files]
+            if not logger.has_errors
+            else []
+        )
+        # By index in jobs, what forest_writer.write_forest_file returned
+        # or the OSError it raised
+        results_by_job: Dict[int, Union[bool, OSError]] = {}
+
+        if dry_run:
+            for forest, final_path in jobs:
+                with open(os.devnull, "w") as f, forest_writer.ForestWriter(
+                    f
+                ) as writer:
+                    forest_writer.write_forest(writer, forest)
+                logger.info(
+                    MessageCodes.I000, "Not writing '{final_path}' due to dry run", None,
+                )
+            jobs = []
 
-        for ff in forest_files:
+        if self.use_process_pool and len(jobs) > 1:
+            pool_results = forest_writer.write_forest_files_in_pool(
+                jobs,
+                self.incremental,
+                max_workers=self.max_workers or None,
+                executable=sys.executable
+                if bpy.app.version >= (2, 91, 0)
+                else bpy.app.binary_path_python,
+            )
             try:
-                write_to_disk(ff)
-            except OSError:
+                with profiler.phase(forest_profiler.WRITE):
+                    for index, result, wall, cpu in pool_results:
+                        results_by_job[index] = result
+                        profiler.record(
+                            forest_profiler.WRITE, wall, cpu, jobs[index][0].file_name
+                        )
+            except (concurrent.futures.BrokenExecutor, OSError) as e:
+                logger.warn(
+                    MessageCodes.W001,
+                    f"Could not write .for files in parallel, writing the rest one at a time: {e}",
+                    None,
+                )
+
+        for index, (forest, final_path) in enumerate(jobs):
+            if index in results_by_job:
                 continue
+            try:
+                with profiler.phase(forest_profiler.WRITE, forest.file_name):
+                    results_by_job[index] = forest_writer.write_forest_file(
+                        forest, final_path, self.incremental
+                    )
+            except OSError as e:
+                results_by_job[index] = e
+        results = [results_by_job[index] for index in range(len(jobs))]
+
+        logger.flush()
+        for (forest, final_path), result in zip(jobs, results):
+            if isinstance(result, OSError):
+                logger.error(
+                    MessageCodes.E013,
+                    f"Could not write '{final_path}': {result.strerror or result}",
+                    None,
+                )
+
+        if self.incremental:
+            # .for files written and .for files skipped because they were unchanged
+            written_count, skipped_count = forest_writer.count_written(results)
+            summary = (
+                f"Wrote {written_count} .for file(s),"
+                f" skipped {skipped_count} unchanged .for file(s)"
+            )
+            logger.info(MessageCodes.I001, summary, None)
+            self.report({"INFO"}, summary)
 
-        if not forest_files and not logger.errors:
+        if not forest_files and not logger.has_errors:
             logger.error(
                 MessageCodes.E010,
                 "Could not find any Root Forests, you must use 2 layers of collections to make forests and their layers with trees",
                 None,
             )
             return {"CANCELLED"}
-        elif logger.errors:
+        elif logger.has_errors:
             return {"CANCELLED"}
         else:
             logger.success(
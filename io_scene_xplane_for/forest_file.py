@@ -6,43 +6,83 @@ from typing import Dict, List, Optional, Tuple
 import bpy
 
 from io_scene_xplane_for import (
-    forest_constants,
+    forest_context,
     forest_header,
     forest_helpers,
+    forest_ir,
     forest_logger,
+    forest_profiler,
+    forest_snapshots,
     forest_tables,
     forest_tree,
+    forest_writer,
+)
+from io_scene_xplane_for.forest_logger import (
+    MessageCategories,
+    MessageCodes,
+    logger,
 )
-from io_scene_xplane_for.forest_logger import MessageCodes, logger
 
 
-def create_potential_forest_files() -> List["forest_file.ForestFile"]:
+def create_potential_forest_files(
+    export_context: Optional[forest_context.ExportContext] = None,
+) -> List["forest_file.ForestFile"]:
+    """
+    export_context is shared by all ForestFiles collected, if None one is
+    made and freed for each of them
+    """
     forest_files = []
-    for exportable_root in forest_helpers.get_exportable_roots_in_scene(
-        bpy.context.scene, bpy.context.view_layer
-    ):
+    profiler = (
+        export_context.profiler
+        if export_context
+        else forest_profiler.Profiler(enabled=False)
+    )
+    with profiler.phase(forest_profiler.ROOT_DISCOVERY):
+        exportable_roots = forest_helpers.get_exportable_roots_in_scene(
+            bpy.context.scene,
+            bpy.context.view_layer,
+            export_context.visibility_index if export_context else None,
+        )
+    for exportable_root in exportable_roots:
         try:
-            forest_files.append(create_forest_single_file(exportable_root))
+            forest_files.append(
+                create_forest_single_file(exportable_root, export_context)
+            )
         except ValueError:
             pass
     return forest_files
 
 
-def create_forest_single_file(exportable_root: forest_helpers.ExportableRoot):
+def create_forest_single_file(
+    exportable_root: forest_helpers.ExportableRoot,
+    export_context: Optional[forest_context.ExportContext] = None,
+):
     ff = ForestFile(exportable_root)
-    ff.collect()
+    if export_context:
+        ff.collect(export_context)
+    else:
+        with forest_context.ExportContext() as export_context:
+            ff.collect(export_context)
     return ff
 
 
 class ForestFile:
     def __init__(self, root_collection: bpy.types.Collection):
         self.trees: List[forest_tree.ForestTree] = []
-        self.randomness = root_collection.xplane_for.forest.randomness
-        self.spacing = root_collection.xplane_for.forest.spacing
+        # Trees by layer number, and by layer number and tree group,
+        # each in the order they were collected. Filled by collect
+        self.trees_by_layer: Dict[int, List[forest_tree.ForestTree]] = {}
+        self.trees_by_layer_and_group: Dict[
+            Tuple[int, int], List[forest_tree.ForestTree]
+        ] = {}
         self.root_collection = root_collection
         file_name = self.root_collection.xplane_for.file_name
         self.file_name = file_name if file_name else self.root_collection.name
         self.header = forest_header.ForestHeader(self)
+        # The root collection's forest settings, set by collect
+        self.forest_settings: Optional[forest_snapshots.ForestSettings] = None
+        # Everything write needs, made at the end of collect
+        self.ir: Optional[forest_ir.ForestIR] = None
 
         # if self.has_perlin_params:
         #     # Maps layer_number to percentage for use with GROUPs
@@ -63,7 +103,9 @@ class ForestFile:
     #         )
     #     )
 
-    def collect(self):
+    def collect(self, export_context: forest_context.ExportContext):
+        """Collects the trees, header and meshes of the forest into self.ir"""
+        self.forest_settings = export_context.get_forest_settings(self.root_collection)
         # try:
         #     total_percentages = round(sum(self.group_percentages.values()))
         # except AttributeError:  # No group_percentages
@@ -92,18 +134,28 @@ class ForestFile:
             for forest_empty in [
                 obj
                 for obj in layer_number_provider.all_objects
-                if obj.type == "EMPTY" and obj.children
+                if obj.type == "EMPTY"
+                and export_context.children_index.get_children(obj)
                 # TODO: Right? We shouldn't be allowing a TREE inside another tree
                 and not obj.parent
-                and forest_helpers.is_visible_in_viewport(obj, bpy.context.view_layer)
+                and export_context.visibility_index.is_visible(obj)
             ]:
                 try:
-                    t = forest_tree.ForestTree(forest_empty, layer_number)
+                    with export_context.profiler.phase(
+                        forest_profiler.TREE_CLASSIFICATION, self.file_name
+                    ):
+                        t = forest_tree.ForestTree(
+                            forest_empty, layer_number, export_context
+                        )
                 except ValueError:
                     pass
                 else:
                     t.collect()
                     self.trees.append(t)
+                    self.trees_by_layer.setdefault(layer_number, []).append(t)
+                    self.trees_by_layer_and_group.setdefault(
+                        (layer_number, t.tree_group), []
+                    ).append(t)
 
             if not self.trees:
                 logger.error(
@@ -113,11 +165,7 @@ class ForestFile:
                 )
                 raise ValueError
 
-            trees_in_layer = [
-                tree
-                for tree in self.trees
-                if tree.vert_info.layer_number == layer_number
-            ]
+            trees_in_layer = self.trees_by_layer.get(layer_number, [])
 
             total_weighted_importance = sum(
                 tree.weighted_importance for tree in trees_in_layer
@@ -138,79 +186,56 @@ class ForestFile:
                     False
                 ), f"Sum of all frequencies for layer {trees_in_layer[0].vert_info.layer_number} is not equal to 100.00, is {total_tree_freqs}"
 
-        self.header.collect()
-
-    def write(self):
-        debug = True
-        o = ""
+        with export_context.profiler.phase(
+            forest_profiler.HEADER_COLLECTION, self.file_name
+        ):
+            self.header.collect(export_context)
 
-        o += self.header.write()
-        o += "\n"
-        written_meshes = set()
+        meshes: List[forest_ir.MeshIR] = []
+        collected_meshes = set()
         for complex_object in sorted(
             set(itertools.chain.from_iterable(t.complex_objects for t in self.trees)),
             key=lambda o: o.data.name,
         ):
             object_name = complex_object.name
             mesh_name = complex_object.data.name
-            print(f"Object name: {object_name}, Mesh Name: {mesh_name}")
-            if mesh_name not in written_meshes:
-                o += forest_tables.write_mesh_table(complex_object=complex_object)
-                written_meshes.add(mesh_name)
-
-        o += "\n"
-        # for group in groups
-        # for layer_number, trees_in_layer in itertools.groupby(
-        #     self.trees, key=lambda tree: tree.vert_info.layer_number
-        # ):
-        #     if self.has_perlin_params:
-        #         o += f"GROUP {layer_number} {forest_helpers.floatToStr(self.group_percentages[layer_number])}\n"
-        #         for tree in trees_in_layer:
-        #             o += "\n".join(
-        #                 "\t" + line for line in f"{tree.write()}\n".splitlines()
-        #             )
-        #     else:
-        #         for tree in trees_in_layer:
-        #             o += f"{tree.write()}\n"
-
-        # get all layers
-        all_layers = []
-        for tree in self.trees:
-            all_layers.append(tree.vert_info.layer_number)
-        all_layers = list(set(all_layers))
-        all_layers.sort()
-
-        for lay in all_layers:
-            if self.header.perlin_choice:
-                for grp in range(4):
-                    trees_in_group = []
-                    for tree in self.trees:
-                        if int(tree.tree_container.xplane_for.tree.tree_group) == grp and tree.vert_info.layer_number == lay:
-                            trees_in_group.append(tree)
-                    if len(trees_in_group) > 0:
-                        wght = self.root_collection.xplane_for.groups_weight[grp]
-                        o += f"GROUP {lay} {wght}"
-                        for tr in trees_in_group:
-                            o += "\n"
-                            o += "\n".join(
-                                "\t" + line for line in f"{tr.write()}\n".splitlines()
-                            )
-                        o += "\n"
-            else:
-                trees_in_layer = []
-                for tree in self.trees:
-                    if tree.vert_info.layer_number == lay:
-                        trees_in_layer.append(tree)
-                if len(trees_in_layer) > 0:
-                    for tr in trees_in_layer:
-                        o += f"{tr.write()}\n"
-        o += "\n"
-
-        for surface_type in forest_constants.SURFACE_TYPES:
-            should_skip_type = getattr(
-                self.root_collection.xplane_for.forest, f"skip_surface_{surface_type}"
+            logger.debug(
+                MessageCodes.D002,
+                lambda: f"Object name: {object_name}, Mesh Name: {mesh_name}",
+                complex_object,
+                category=MessageCategories.MESH,
             )
-            if should_skip_type:
-                o += f"\nSKIP_SURFACE {surface_type}"
-
-        return o
+            if mesh_name not in collected_meshes:
+                with export_context.profiler.phase(
+                    forest_profiler.MESH_TABLE, self.file_name, mesh_name
+                ):
+                    meshes.append(
+                        forest_tables.collect_mesh_table(complex_object, export_context)
+                    )
+                collected_meshes.add(mesh_name)
+
+        tree_irs = {tree: tree.to_ir() for tree in self.trees}
+        self.ir = forest_ir.ForestIR(
+            file_name=self.file_name,
+            header=self.header.to_ir(),
+            meshes=meshes,
+            trees=list(tree_irs.values()),
+            trees_by_layer={
+                layer_number: [tree_irs[tree] for tree in trees]
+                for layer_number, trees in self.trees_by_layer.items()
+            },
+            trees_by_layer_and_group={
+                key: [tree_irs[tree] for tree in trees]
+                for key, trees in self.trees_by_layer_and_group.items()
+            },
+            groups_weight=tuple(self.root_collection.xplane_for.groups_weight),
+            skip_surfaces=list(self.forest_settings.skip_surfaces),
+        )
+
+    def write(self) -> str:
+        """Returns the whole .for file as a str, see write_to"""
+        return forest_writer.write_to_str(self.write_to)
+
+    def write_to(self, writer: forest_writer.ForestWriter) -> None:
+        """Streams the .for file, as collected, into writer"""
+        forest_writer.write_forest(writer, self.ir)
@@ -12,9 +12,10 @@ import bmesh
 import bpy
 import mathutils
 from io_scene_xplane_for import (
-    forest_constants,
+    forest_context,
     forest_file,
-    forest_helpers,
+    forest_ir,
+    forest_snapshots,
     forest_tables,
 )
 from io_scene_xplane_for.forest_logger import logger, MessageCodes
@@ -27,33 +28,22 @@ class ForestHeader:
         self.scale_x: int = None
         self.scale_y: int = None
 
-        def get_params(perlin_type: str):
-            """perlin_type is perlin_density, perlin_choice, perlin_height"""
-            has_param = getattr(
-                self.forest_file.root_collection.xplane_for.forest,
-                "has_" + perlin_type,
-            )
-            if has_param:
-                perlin_group = getattr(
-                    self.forest_file.root_collection.xplane_for.forest, perlin_type
-                )
-                return list(
-                    itertools.chain(
-                        perlin_group.wavelength_amp_1,
-                        perlin_group.wavelength_amp_2,
-                        perlin_group.wavelength_amp_3,
-                        perlin_group.wavelength_amp_4,
-                    )
-                )
-            else:
-                return None
-
-        self.perlin_density: Optional[List[float]] = get_params("perlin_density")
-        self.perlin_choice: Optional[List[float]] = get_params("perlin_choice")
-        self.perlin_height: Optional[List[float]] = get_params("perlin_height")
-
-    def collect(self):
+        self.shader_2D: Optional[bpy.types.Material] = None
+        self.shader_3D: Optional[bpy.types.Material] = None
+        self._shader_settings: Tuple[
+            Optional[forest_snapshots.MaterialSettings], ...
+        ] = (None, None)
+        # Filled by collect
+        self.perlin_density: Optional[List[float]] = None
+        self.perlin_choice: Optional[List[float]] = None
+        self.perlin_height: Optional[List[float]] = None
+
+    def collect(self, export_context: "forest_context.ExportContext"):
         """Must be called after trees are collected. Raises ValueError for various problems"""
+        forest_settings = self.forest_file.forest_settings
+        for perlin_type in ("perlin_density", "perlin_choice", "perlin_height"):
+            perlin_params = getattr(forest_settings, perlin_type)
+            setattr(self, perlin_type, list(perlin_params) if perlin_params else None)
 
         def collect_shader_materials() -> Tuple[bpy.types.Material, Optional[bpy.types.Material]]:
             shader_materials = [None, None]
@@ -98,116 +88,51 @@ class ForestHeader:
             return shader_materials
 
         self.shader_2D, self.shader_3D = collect_shader_materials()
-        self.scale_x, self.scale_y = self.forest_file.trees[0].texture_image.size
-
-    def write(self):
-        o = ""
-
-        forest_settings = self.forest_file.root_collection.xplane_for.forest
-        o += "\n".join(("A", "800", "FOREST",)) + "\n"
-
-        o += "\n"
-        o += self._write_shader("SHADER_2D", self.shader_2D) + "\n"
-
-        if self.shader_3D:
-            o += "\n"
-            o += self._write_shader("SHADER_3D", self.shader_3D) + "\n"
-
-        o += "\n"
-        o += (
-            "\n".join(
-                directive
-                for directive in (
-                    f"LOD\t{forest_helpers.floatToStr(forest_settings.max_lod)}"
-                    if forest_settings.has_max_lod
-                    else f"",
-                    f"SCALE_X\t{self.scale_x}",
-                    f"SCALE_Y\t{self.scale_y}",
-                    f"SPACING\t{' '.join(map(forest_helpers.floatToStr,self.forest_file.spacing))}",
-                    f"RANDOM\t{' '.join(map(forest_helpers.floatToStr,self.forest_file.randomness))}",
-                    "" if forest_settings.cast_shadow else "NO_SHADOW",
-                )
-                if directive
-            )
-            + "\n"
+        self.scale_x, self.scale_y = self.forest_file.trees[0].texture_size
+        self._shader_settings = tuple(
+            export_context.get_material_settings(material) if material else None
+            for material in (self.shader_2D, self.shader_3D)
         )
-        o += self._write_perlin_params()
-
-        return o
-
-    def _write_perlin_params(self) -> str:
-        def fmt_perlin_params(directive: str, perlin_params):
-            try:
-                s = f"{directive} " + (
-                    "\t".join(
-                        " ".join(map(forest_helpers.floatToStr, param_pair))
-                        for param_pair in zip(perlin_params[:-1:2], perlin_params[1::2])
-                    )
-                )
-                return s
-            except (AttributeError, TypeError) as e:
-                return ""
 
-        return "\n".join(
-            directive
-            for directive in (
-                fmt_perlin_params("DENSITY_PARAMS", self.perlin_density),
-                fmt_perlin_params("CHOICE_PARAMS", self.perlin_choice),
-                fmt_perlin_params("HEIGHT_PARAMS", self.perlin_height),
-            )
-            if directive
+    def to_ir(self) -> forest_ir.HeaderIR:
+        forest_settings = self.forest_file.forest_settings
+        return forest_ir.HeaderIR(
+            shader_2D=_shader_to_ir(self._shader_settings[0]),
+            shader_3D=_shader_to_ir(self._shader_settings[1]),
+            has_seasons=forest_settings.has_seasons,
+            has_max_lod=forest_settings.has_max_lod,
+            max_lod=forest_settings.max_lod,
+            scale_x=self.scale_x,
+            scale_y=self.scale_y,
+            spacing=forest_settings.spacing,
+            randomness=forest_settings.randomness,
+            cast_shadow=forest_settings.cast_shadow,
+            perlin_density=self.perlin_density,
+            perlin_choice=self.perlin_choice,
+            perlin_height=self.perlin_height,
         )
 
-    def _write_shader(
-        self, shader_type: str, shader_material: bpy.types.Material
-    ) -> str:
-        """Where shader_type is 'SHADER_2D' or 'SHADER_3D'"""
-        mat_settings = shader_material.xplane_for
-        # TODO: pathlib this!
-        texture_path = mat_settings.texture_path.replace("//", "").replace("\\", "/")
-        texture_path_normal = mat_settings.texture_path_normal.replace(
-            "//", ""
-        ).replace("\\", "/")
-        texture_path_weather = mat_settings.texture_path_weather.replace("//", "").replace("\\", "/")
-        # get luma values
-        luma = ''
-        for i in range(0, 4):
-            luma += str(round(mat_settings.luma_values[i], 4)) + ' '
-        o = "\n".join(
-            "\t" + directive if directive != shader_type else shader_type
-            for directive in (
-                shader_type,
-                f"TEXTURE {texture_path}",
-                f"SEASONAL {texture_path}"
-                if self.forest_file.root_collection.xplane_for.forest.has_seasons
-                else "",
-                f"TEXTURE_NORMAL {forest_helpers.floatToStr(mat_settings.texture_path_normal_ratio)}\t{texture_path_normal}"
-                if mat_settings.texture_path_normal
-                else "",
-                f"WEATHER {texture_path_weather}"
-                if mat_settings.texture_path_weather and not mat_settings.has_luma_values
-                else "",
-                f"SNOW_ALBEDO_LUMA {luma}"
-                if mat_settings.has_luma_values
-                else "",
-                f"NO_BLEND {forest_helpers.floatToStr(mat_settings.no_blend_level)}"
-                if mat_settings.blend_mode == forest_constants.BLEND_NO_BLEND
-                else "",
-                f"BLEND_HASH {forest_helpers.floatToStr(mat_settings.blend_hash_level)}"
-                if mat_settings.blend_mode == forest_constants.BLEND_BLEND_HASH
-                else "",
-                f"SPECULAR {forest_helpers.floatToStr(mat_settings.specular)}"
-                if mat_settings.has_specular
-                else "",
-                f"BUMP_LEVEL {forest_helpers.floatToStr(mat_settings.bump_level)}"
-                if mat_settings.has_bump_level
-                else "",
-                "NO_SHADOW" if mat_settings.no_shadow else "",
-                "SHADOW_BLEND" if mat_settings.shadow_blend else "",
-                f"{mat_settings.normal_mode}"
-                if mat_settings.normal_mode != forest_constants.NORMAL_MODE_NONE
-                else "",
-            )
-            if directive
-        )
-        return o
+
+def _shader_to_ir(
+    mat_settings: Optional[forest_snapshots.MaterialSettings],
+) -> Optional[forest_ir.ShaderIR]:
+    if not mat_settings:
+        return None
+    return forest_ir.ShaderIR(
+        texture_path=mat_settings.texture_path,
+        texture_path_normal=mat_settings.texture_path_normal,
+        texture_path_normal_ratio=mat_settings.texture_path_normal_ratio,
+        texture_path_weather=mat_settings.texture_path_weather,
+        has_luma_values=mat_settings.has_luma_values,
+        luma_values=mat_settings.luma_values,
+        blend_mode=mat_settings.blend_mode,
+        no_blend_level=mat_settings.no_blend_level,
+        blend_hash_level=mat_settings.blend_hash_level,
+        has_specular=mat_settings.has_specular,
+        specular=mat_settings.specular,
+        has_bump_level=mat_settings.has_bump_level,
+        bump_level=mat_settings.bump_level,
+        no_shadow=mat_settings.no_shadow,
+        shadow_blend=mat_settings.shadow_blend,
+        normal_mode=mat_settings.normal_mode,
+    )
@@ -1,12 +1,15 @@
 import itertools
 import os
-from typing import Iterable, List, Optional, Tuple, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import bpy
 import mathutils
 
 from .forest_constants import *
 
+# Kept here as well, where it always was
+from io_scene_xplane_for.forest_writer import floatToStr
+
 """
 Given the difficulty in keeping all these words straight, these
 types have been created. Use these to keep yourself from
@@ -29,22 +32,6 @@ children are not compatible
 BlenderParentType = Union[bpy.types.Collection, bpy.types.Object]
 
 
-def floatToStr(n: float) -> str:
-    """
-    Makes a rounded float with as 0's
-    and decimal place removed if possible
-    """
-    # THIS IS A HOT PATH, DO NOT CHANGE WITHOUT PROFILING
-
-    # 'g' can do the rstrip and '.' removal for us, except for rare cases when we need to fallback
-    # to the less fast 'f', rstrip, ternary approach
-    s = f"{n:.{PRECISION_OBJ_FLOAT}g}"
-    if "e" in s:
-        s = f"{n:.{PRECISION_OBJ_FLOAT}f}".rstrip("0")
-        return s if s[-1] != "." else s[:-1]
-    return s
-
-
 def get_collections_in_scene(scene: bpy.types.Scene) -> List[bpy.types.Collection]:
     """
     First entry in list is always the scene's 'Master Collection'
@@ -74,12 +61,13 @@ def get_layer_collections_in_view_layer(
 
 
 def get_exportable_roots_in_scene(
-    scene: bpy.types.Scene, view_layer: bpy.types.ViewLayer
+    scene: bpy.types.Scene,
+    view_layer: bpy.types.ViewLayer,
+    visibility_index: Optional["VisibilityIndex"] = None,
 ) -> List[ExportableRoot]:
+    visibility_index = visibility_index or VisibilityIndex(view_layer)
     return [
-        root
-        for root in scene.collection.children
-        if is_visible_in_viewport(root, view_layer)
+        root for root in scene.collection.children if visibility_index.is_visible(root)
     ]
 
 
@@ -87,15 +75,51 @@ def get_plugin_resources_folder() -> str:
     return os.path.join(os.path.dirname(__file__), "resources")
 
 
+class VisibilityIndex:
+    """
+    Answers is_visible_in_viewport for one view layer, made in a single walk
+    of its layer collections instead of one walk per question.
+
+    Object visibility is remembered, so make a new index after
+    changing what's hidden
+    """
+
+    def __init__(self, view_layer: bpy.types.ViewLayer):
+        self.view_layer = view_layer
+        # Layer collections have the same name as their collection
+        self.layer_collections: Dict[str, bpy.types.LayerCollection] = {
+            layer_col.name: layer_col
+            for layer_col in get_layer_collections_in_view_layer(view_layer)
+        }
+        self._visible_objects: Dict[str, bool] = {}
+
+    def get_layer_collection(
+        self, collection: bpy.types.Collection
+    ) -> bpy.types.LayerCollection:
+        """Raises KeyError if collection isn't in the view layer"""
+        return self.layer_collections[collection.name]
+
+    def is_visible(
+        self, datablock: Union[bpy.types.Collection, bpy.types.Object]
+    ) -> bool:
+        if isinstance(datablock, bpy.types.Collection):
+            return self.get_layer_collection(datablock).is_visible
+        try:
+            return self._visible_objects[datablock.name]
+        except KeyError:
+            visible = self._visible_objects[datablock.name] = datablock.visible_get(
+                view_layer=self.view_layer
+            )
+            return visible
+
+
 def is_visible_in_viewport(
     datablock: Union[bpy.types.Collection, bpy.types.Object],
     view_layer: bpy.types.ViewLayer,
 ) -> Optional[ExportableRoot]:
+    """When asking about many datablocks, use a VisibilityIndex instead"""
     if isinstance(datablock, bpy.types.Collection):
-        all_layer_collections = {
-            c.name: c for c in get_layer_collections_in_view_layer(view_layer)
-        }
-        return all_layer_collections[datablock.name].is_visible
+        return VisibilityIndex(view_layer).is_visible(datablock)
     else:
         return datablock.visible_get(view_layer=view_layer)
 
@@ -112,17 +136,52 @@ def is_exportable_root(
         and is_visible_in_viewport(potential_root, view_layer)
     )
 
+class ChildrenIndex:
+    """
+    Every object's children, made in one pass over bpy.data.objects
+    instead of asking each object for its children.
+
+    Children are in the same order Object.children has them.
+    Make a new index after changing any parent
+    """
+
+    def __init__(self, objects: Optional[Iterable[bpy.types.Object]] = None):
+        # Keyed by parent name
+        self._children: Dict[str, List[bpy.types.Object]] = {}
+        for obj in bpy.data.objects if objects is None else objects:
+            if obj.parent:
+                self._children.setdefault(obj.parent.name, []).append(obj)
+
+    def get_children(
+        self, datablock: BlenderParentType
+    ) -> List[Union[bpy.types.Collection, bpy.types.Object]]:
+        if isinstance(datablock, bpy.types.Collection):
+            return list(datablock.children)
+        return self._children.get(datablock.name, [])
+
+    def get_descendants(
+        self, datablock: BlenderParentType
+    ) -> List[Union[bpy.types.Collection, bpy.types.Object]]:
+        """
+        All children, grandchildren, etc. Each datablock's children are
+        followed by the descendants of its first child, then its second...
+        """
+        descendants = []
+        stack = [datablock]
+        while stack:
+            children = self.get_children(stack.pop())
+            descendants.extend(children)
+            stack.extend(reversed(children))
+        return descendants
+
+
 def get_all_children_recursive(
-        datablock:Union[bpy.types.Collection, bpy.types.Object]
-        )->List[Union[bpy.types.Collection, bpy.types.Object]]:
-    c = []
-    def _get_all_children_recursive(db):
-        c.extend(db.children)
-        for child in db.children:
-            get_all_children_recursive(child)
-    _get_all_children_recursive(datablock)
-
-    return c
+    datablock: Union[bpy.types.Collection, bpy.types.Object],
+    children_index: Optional[ChildrenIndex] = None,
+) -> List[Union[bpy.types.Collection, bpy.types.Object]]:
+    """When asking about many datablocks, share a ChildrenIndex between calls"""
+    return (children_index or ChildrenIndex()).get_descendants(datablock)
+
 
 def round_vec(v: mathutils.Vector, ndigits: int = 5) -> mathutils.Vector:
     return mathutils.Vector(round(comp, ndigits) for comp in v)
@@ -0,0 +1,46 @@
+"""
+Reads the width and height of PNG and DDS images from their headers,
+without decoding any pixels like bpy.types.Image.size does.
+
+Nothing here may use bpy
+"""
+import functools
+import os
+import struct
+from typing import Optional, Tuple
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_DDS_MAGIC = b"DDS "
+
+
+def get_image_size(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Returns the (width, height) of the PNG or DDS image at path,
+    or None if it's missing, another format, or its header can't be read.
+
+    Results are cached until the file is modified
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _read_image_size(path, mtime_ns)
+
+
+@functools.lru_cache(maxsize=1024)
+def _read_image_size(path: str, mtime_ns: int) -> Optional[Tuple[int, int]]:
+    """mtime_ns is only part of the cache key"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(24)
+    except OSError:
+        return None
+
+    if header[:8] == _PNG_SIGNATURE and header[12:16] == b"IHDR" and len(header) >= 24:
+        width, height = struct.unpack(">II", header[16:24])
+    elif header[:4] == _DDS_MAGIC and len(header) >= 20:
+        # DDS_HEADER's dwSize and dwFlags come before dwHeight and dwWidth
+        height, width = struct.unpack("<II", header[12:20])
+    else:
+        return None
+    return (width, height) if width and height else None
@@ -0,0 +1,202 @@
+"""
+ForestIR is a plain Python snapshot of everything that goes into a .for file,
+made in one collection pass by ForestFile.collect.
+
+Nothing here (or in forest_writer, which writes a ForestIR) may use bpy,
+so writing can be profiled, cached, or run in another process
+"""
+import dataclasses
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy
+
+from io_scene_xplane_for import forest_writer
+
+
+@dataclasses.dataclass
+class TreeStruct:
+    """A TREE row, slotted since there's one per tree"""
+
+    __slots__ = (
+        "s",
+        "t",
+        "w",
+        "h",
+        "offset",
+        "freq",
+        "min_height",
+        "max_height",
+        "quads",
+        "layer_number",
+        "notes",
+    )
+    s: int
+    t: int
+    w: int
+    h: int
+    offset: int
+    freq: float  # This is filled in later when all trees are collected
+    min_height: float
+    max_height: float
+    quads: int
+    layer_number: int
+    notes: str
+
+    def __post_init__(self):
+        for attr, factory in _TREE_STRUCT_FIELDS:
+            try:
+                setattr(self, attr, factory(getattr(self, attr)))
+            except ValueError:
+                print(
+                    f"Couldn't convert '{attr}''s value ({getattr(self, attr)}) with {factory}"
+                )
+
+    def __str__(self) -> str:
+        def fmt(s):
+            try:
+                return forest_writer.floatToStr(float(s))
+            except (TypeError, ValueError):
+                return s
+
+        return "\t".join(fmt(getattr(self, attr)) for attr in self.__slots__)
+
+
+@dataclasses.dataclass
+class YQuadStruct:
+    """A Y_QUAD row, slotted since there's one per tree"""
+
+    __slots__ = (
+        "s",
+        "t",
+        "w",
+        "h",
+        "offset_center_x",
+        "offset_center_y",
+        "quad_width",
+        "elevation",
+        "psi_rotation",
+    )
+    s: int
+    t: int
+    w: int
+    h: int
+    offset_center_x: int
+    offset_center_y: int
+    quad_width: int  # pixels, relative to vertical tree
+    elevation: int  # pixels, relative to vertical tree
+    psi_rotation: float
+
+    def __post_init__(self):
+        for attr, factory in _Y_QUAD_STRUCT_FIELDS:
+            try:
+                setattr(self, attr, factory(getattr(self, attr)))
+            except ValueError:
+                assert (
+                    False
+                ), f"Couldn't convert '{attr}''s value ({getattr(self, attr)}) with {factory}"
+
+    def __str__(self) -> str:
+        return "\t".join(str(getattr(self, attr)) for attr in self.__slots__)
+
+
+# Each field and the type its value is converted to, looked up once
+_TREE_STRUCT_FIELDS = tuple(TreeStruct.__annotations__.items())
+_Y_QUAD_STRUCT_FIELDS = tuple(YQuadStruct.__annotations__.items())
+
+
+@dataclasses.dataclass
+class ShaderIR:
+    """The XPlaneForMaterialSettings of a SHADER_2D or SHADER_3D material"""
+
+    texture_path: str
+    texture_path_normal: str
+    texture_path_normal_ratio: float
+    texture_path_weather: str
+    has_luma_values: bool
+    luma_values: Tuple[float, float, float, float]
+    blend_mode: str
+    no_blend_level: float
+    blend_hash_level: float
+    has_specular: bool
+    specular: float
+    has_bump_level: bool
+    bump_level: float
+    no_shadow: bool
+    shadow_blend: bool
+    normal_mode: str
+
+
+@dataclasses.dataclass
+class HeaderIR:
+    shader_2D: ShaderIR
+    shader_3D: Optional[ShaderIR]
+    has_seasons: bool
+    has_max_lod: bool
+    max_lod: int
+    scale_x: int
+    scale_y: int
+    spacing: Tuple[float, float]
+    randomness: Tuple[float, float]
+    cast_shadow: bool
+    # Each is None if the forest doesn't have it
+    perlin_density: Optional[List[float]]
+    perlin_choice: Optional[List[float]]
+    perlin_height: Optional[List[float]]
+
+
+@dataclasses.dataclass
+class TreeIR:
+    vert_info: TreeStruct
+    # None if the tree has no Y_QUAD
+    horz_info: Optional[YQuadStruct]
+    use_custom_lod: bool
+    custom_lod: int
+    tree_group: int
+    mesh_names: List[str]
+
+
+@dataclasses.dataclass
+class MeshIR:
+    """
+    A 3D mesh, ready for its MESH.... VERTEX.... IDX.... table.
+
+    vertices is a (n, 11) float32 array of location, normal, s, t,
+    w_stiffness, w_edge_stiffness, w_phase, already in X-Plane's axes,
+    indices is the int32 array of each (clockwise) triangle's vertices
+    """
+
+    name: str
+    lod_near: int
+    lod_far: int
+    wind_bend_ratio: float
+    branch_stiffness: float
+    wind_speed: float
+    no_shadow: bool
+    vertices: numpy.ndarray
+    indices: numpy.ndarray
+    # True if this MeshIR may be written in more than one .for file.
+    # Its table is then kept after the first time it is formatted
+    shared: bool = False
+    table: Optional[str] = dataclasses.field(default=None, repr=False)
+    # Called once table is set, so a cache holding this can count its size
+    on_table: Optional[Callable[["MeshIR"], None]] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    def __getstate__(self):
+        # The hook belongs to this process's cache, it's never pickled with it
+        return {**self.__dict__, "on_table": None}
+
+
+@dataclasses.dataclass
+class ForestIR:
+    file_name: str
+    header: HeaderIR
+    meshes: List[MeshIR]
+    trees: List[TreeIR]
+    # Each in the order of trees
+    trees_by_layer: Dict[int, List[TreeIR]]
+    trees_by_layer_and_group: Dict[Tuple[int, int], List[TreeIR]]
+    groups_weight: Tuple[int, int, int, int]
+    # In forest_constants.SURFACE_TYPES order
+    skip_surfaces: List[str]
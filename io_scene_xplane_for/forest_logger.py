@@ -1,6 +1,9 @@
 import bpy
 import enum
-from typing import Any, Callable, IO, List, Optional
+import json
+import queue
+import threading
+from typing import Any, Callable, Dict, IO, Iterable, List, Optional, Tuple, Union
 import dataclasses
 
 message_to_str_count = 0
@@ -27,12 +30,21 @@ class MessageTypes(enum.Enum):
     All MessageCodes should start with one of these values
     """
 
+    DEBUG = "D"
     INFO = "I"
     WARNING = "W"
     ERROR = "E"
     SUCCESS = "S"
 
 
+class MessageCategories(enum.Enum):
+    """What part of the export a message is about, to filter by"""
+
+    GENERAL = "general"
+    TREE = "tree"
+    MESH = "mesh"
+
+
 class MessageCodes(enum.Enum):
     """
     Unit tests and the export log use these to communicate what happened without needing to parse the message itself.
@@ -47,7 +59,16 @@ class MessageCodes(enum.Enum):
     #
     # TODO: Pick a scheme and start using that,
     # QUICK!
+    D000 = "Collecting a tree"
+    D001 = "Classified a tree's child"
+    D002 = "Collecting a mesh table"
     I000 = "Not writing file due to dry run"
+    I001 = "Files written and skipped as unchanged"
+    W000 = "Could not use the mesh cache folder"
+    W001 = "Could not write .for files in parallel"
+    W002 = "Could not write the profile report"
+    W003 = "Could not open or write the log file"
+    W004 = "Too many different messages with the same code"
     E000 = "Unknown error"
     E001 = "Bad layer number name"
     E002 = "Couldn't find texture file"
@@ -60,9 +81,28 @@ class MessageCodes(enum.Enum):
     E010 = "Could not find any forests to export"
     E011 = "No valid trees found"
     E012 = "Image size x or y can't be 0,0"
+    E013 = "Could not write .for file"
     S000 = ".for exported successfully"
 
 
+# What every MessageCodes' MessageTypes is, so log doesn't work it out each time
+_MSG_TYPES = {code: MessageTypes(code.name[0]) for code in MessageCodes}
+
+# Everything but DEBUG, what a logger keeps unless told otherwise
+DEFAULT_MSG_TYPES = [t for t in MessageTypes if t != MessageTypes.DEBUG]
+
+# Only these are limited to ForestLogger.max_per_code messages per code
+_CAPPED_MSG_TYPES = frozenset({MessageTypes.WARNING, MessageTypes.ERROR})
+
+
+def _datablock_name(datablock: Any) -> Optional[str]:
+    """datablock's name, or None if it has none or was removed"""
+    try:
+        return getattr(datablock, "name", None)
+    except ReferenceError:
+        return None
+
+
 class _Singleton(type):
     _instances: Optional["_Singleton"] = {}
 
@@ -82,84 +122,339 @@ class ForestLogger(metaclass=_Singleton):
         # This is a free variable used to customize how this message is logged.
         # It should be used sparingly
         msg_context: Any
+        msg_category: MessageCategories = MessageCategories.GENERAL
+        # How many times this code and content were logged, see ForestLogger.log
+        count: int = 1
+        # The first few problem datablocks of all those times
+        problem_datablocks: List[Any] = dataclasses.field(default_factory=list)
 
         def __str__(self) -> str:
-            return f"{self.msg_code.name}: {self.msg_content or self.msg_code.value}"
+            s = f"{self.msg_code.name}: {self.msg_content or self.msg_code.value}"
+            if self.count > 1:
+                names = ", ".join(
+                    filter(None, map(_datablock_name, self.problem_datablocks))
+                )
+                s += f" ({self.count} times" + (f", e.g. {names})" if names else ")")
+            return s
 
         @property
-        def msg_type(self):
-            d = {
-                "I": MessageTypes.INFO,
-                "W": MessageTypes.WARNING,
-                "E": MessageTypes.ERROR,
-                "S": MessageTypes.SUCCESS,
-            }
-            return d[self.msg_code.name[0]]
+        def msg_type(self) -> MessageTypes:
+            return _MSG_TYPES[self.msg_code]
 
     class ConsoleTransport:
+        """
+        Prints messages when flushed, so each is shown with how many times
+        it was logged until then
+        """
+
         def __init__(self):
-            self.count = 0
+            self._messages: List["ForestLogger.Message"] = []
 
         def __call__(self, msg: "ForestLogger.Message") -> None:
-            if self.count == 1:
-                print()
-            print(str(msg))
-            self.count += 1
+            self._messages.append(msg)
+
+        def flush(self) -> None:
+            if self._messages:
+                print("".join(f"{msg}\n" for msg in self._messages), end="")
+                self._messages.clear()
 
     class FileTransport:
-        def __init__(self, filehandle: IO):
+        """
+        Writes messages to filehandle, max_buffered at a time and when flushed
+        """
+
+        def __init__(self, filehandle: IO, max_buffered: int = 1000):
             self.filehandle = filehandle
+            self.max_buffered = max_buffered
+            self._messages: List["ForestLogger.Message"] = []
 
         def __call__(self, msg: "ForestLogger.Message") -> None:
+            self._messages.append(msg)
+            if len(self._messages) >= self.max_buffered:
+                self.flush()
+
+        def flush(self) -> None:
+            if not self._messages:
+                return
             try:
-                self.filehandle.write(str(msg) + "\n")
+                self.filehandle.write("".join(f"{msg}\n" for msg in self._messages))
+                self.filehandle.flush()
             except IOError as ioe:
-                assert False, "File transport failed:\n" + ioe
+                assert False, "File transport failed:\n" + str(ioe)
+            finally:
+                self._messages.clear()
 
     class InternalTextTransport:
-        def __init__(self, name="ForestLogger.log") -> None:
+        """
+        Writes messages to a Text datablock, max_buffered at a time
+        and when flushed, instead of one Text.write per message
+        """
+
+        def __init__(self, name="ForestLogger.log", max_buffered: int = 1000) -> None:
             if bpy.data.texts.find(name) == -1:
                 self.log_txt_block = bpy.data.texts.new(name)
             else:
                 self.log_txt_block = bpy.data.texts[name]
 
             self.log_txt_block.clear()
+            self.max_buffered = max_buffered
+            self._messages: List["ForestLogger.Message"] = []
 
         def __call__(self, msg: "ForestLogger.Message") -> None:
-            self.log_txt_block.write(f"{msg}\n")
+            self._messages.append(msg)
+            if len(self._messages) >= self.max_buffered:
+                self.flush()
+
+        def flush(self) -> None:
+            if self._messages:
+                self.log_txt_block.write("".join(f"{msg}\n" for msg in self._messages))
+                self._messages.clear()
+
+    class JSONLinesTransport:
+        """
+        Writes each message as a line of JSON to the file at path,
+        from a background thread so logging doesn't wait on the disk.
+        Messages are handed to the thread max_buffered at a time.
+
+        flush waits for everything logged so far to be written,
+        close does too and then stops the thread. Both raise the first
+        error the thread had writing, once, and do nothing once closed
+        """
+
+        def __init__(self, path: str, max_buffered: int = 1000) -> None:
+            self.path = path
+            self.closed = False
+            self._file = open(path, "w")
+            self.max_buffered = max_buffered
+            self._messages: List["ForestLogger.Message"] = []
+            self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+            # The first error writing, raised once by flush or close
+            self._error: Optional[Exception] = None
+            self._error_raised = False
+            self._thread = threading.Thread(
+                target=self._write_records, name="ForestLogger JSON lines", daemon=True
+            )
+            self._thread.start()
+
+        def __call__(self, msg: "ForestLogger.Message") -> None:
+            if self.closed:
+                return
+            self._messages.append(msg)
+            if len(self._messages) >= self.max_buffered:
+                self._hand_over()
+
+        def _hand_over(self) -> None:
+            # Datablocks can only be read from here, the main thread
+            for msg in self._messages:
+                self._queue.put(
+                    {
+                        "code": msg.msg_code.name,
+                        "type": msg.msg_type.name,
+                        "category": msg.msg_category.value,
+                        "content": msg.msg_content or msg.msg_code.value,
+                        "count": msg.count,
+                        "datablocks": [
+                            _datablock_name(datablock)
+                            for datablock in msg.problem_datablocks
+                        ],
+                    }
+                )
+            self._messages.clear()
+
+        def _write_records(self) -> None:
+            # Every record must be marked done, or flush would wait forever
+            while True:
+                record = self._queue.get()
+                try:
+                    if record is None:
+                        return
+                    # After an error, the rest are dropped
+                    if self._error is None:
+                        self._file.write(json.dumps(record) + "\n")
+                except Exception as e:
+                    self._error = e
+                finally:
+                    self._queue.task_done()
+
+        def _raise_error(self) -> None:
+            if self._error is not None and not self._error_raised:
+                self._error_raised = True
+                raise self._error
+
+        def flush(self) -> None:
+            if self.closed:
+                return
+            self._hand_over()
+            self._queue.join()
+            if self._error is None:
+                try:
+                    self._file.flush()
+                except OSError as e:
+                    self._error = e
+            self._raise_error()
+
+        def close(self) -> None:
+            if self.closed:
+                return
+            self.closed = True
+            self._hand_over()
+            if self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            try:
+                self._file.close()
+            except OSError as e:
+                if self._error is None:
+                    self._error = e
+            self._raise_error()
 
     def __init__(
-        self, transports: Optional = None, msg_types: List[MessageTypes] = None
+        self,
+        transports: Optional = None,
+        msg_types: Optional[Iterable[MessageTypes]] = None,
+        msg_categories: Optional[Iterable[MessageCategories]] = None,
     ):
-        self.transports = transports or [ForestLogger.ConsoleTransport()]
         self._messages: List["ForestLogger.Message"] = []
-        self.msg_types = msg_types or list(MessageTypes)
-
-    def reset(self, transports: Optional = None, msg_types: List[MessageTypes] = None):
+        # Every message kept, by type, in the order they were logged
+        self._messages_by_type: Dict[MessageTypes, List["ForestLogger.Message"]] = {
+            msg_type: [] for msg_type in MessageTypes
+        }
+        # Every message kept, by code and content
+        self._messages_by_key: Dict[Tuple[MessageCodes, str], ForestLogger.Message] = {}
+        # How many messages were kept, and not kept because of max_per_code, by code
+        self._kept_per_code: Dict[MessageCodes, int] = {}
+        self._dropped_per_code: Dict[MessageCodes, int] = {}
+        # See log
+        self.max_per_code = 100
+        self.max_samples = 5
+        self.reset(transports, msg_types, msg_categories)
+
+    def reset(
+        self,
+        transports: Optional = None,
+        msg_types: Optional[Iterable[MessageTypes]] = None,
+        msg_categories: Optional[Iterable[MessageCategories]] = None,
+    ):
+        """
+        Clears all messages and sets what's kept. Only messages of one of msg_types
+        (DEFAULT_MSG_TYPES if None) and msg_categories (all if None) are kept
+        and passed to the transports, the rest are dropped unformatted.
+
+        Errors are always kept, whether an export failed depends on them.
+        The old transports are flushed first
+        """
+        if hasattr(self, "transports"):
+            self.flush()
         self.transports = transports or [ForestLogger.ConsoleTransport()]
         self._messages.clear()
-        self.msg_types = msg_types or list(MessageTypes)
+        for messages in self._messages_by_type.values():
+            messages.clear()
+        self._messages_by_key.clear()
+        self._kept_per_code.clear()
+        self._dropped_per_code.clear()
+        self.msg_types = frozenset(msg_types or DEFAULT_MSG_TYPES) | {
+            MessageTypes.ERROR
+        }
+        self.msg_categories = frozenset(msg_categories or MessageCategories)
+
+    def is_enabled_for(
+        self,
+        msg_type: MessageTypes,
+        msg_category: MessageCategories = MessageCategories.GENERAL,
+    ) -> bool:
+        """
+        True if messages of msg_type and msg_category are kept,
+        for skipping expensive work done only to log
+        """
+        return msg_type == MessageTypes.ERROR or (
+            msg_type in self.msg_types and msg_category in self.msg_categories
+        )
 
     def log(
         self,
         msg_code: MessageCodes,
-        msg_content: str,
+        msg_content: Union[str, Callable[[], str]],
         problem_datablock=None,
         msg_context=None,
+        msg_category: MessageCategories = MessageCategories.GENERAL,
     ):
-        # TODO: add filtering by type
-        if msg_code.name in self.msg_types or True:
-            msg = ForestLogger.Message(
-                msg_code=msg_code,
-                msg_content=msg_content,
-                problem_datablock=problem_datablock,
-                msg_context=msg_context,
+        """
+        msg_content can be a function returning the content,
+        only called if the message is kept.
+
+        A message with the same code and content as one already kept
+        only adds to its count and, up to max_samples, its problem_datablocks.
+        Past max_per_code different warnings or errors of a code, the rest
+        are only counted, see dropped_counts. Diagnostics like debug messages,
+        different for every object, are never capped
+        """
+        msg_type = _MSG_TYPES[msg_code]
+        if not self.is_enabled_for(msg_type, msg_category):
+            return
+        if callable(msg_content):
+            msg_content = msg_content()
+
+        key = (msg_code, msg_content)
+        msg = self._messages_by_key.get(key)
+        if msg:
+            msg.count += 1
+            if (
+                problem_datablock is not None
+                and len(msg.problem_datablocks) < self.max_samples
+            ):
+                msg.problem_datablocks.append(problem_datablock)
+            return
+
+        if msg_type in _CAPPED_MSG_TYPES:
+            kept = self._kept_per_code.get(msg_code, 0)
+            if kept >= self.max_per_code:
+                self._dropped_per_code[msg_code] = (
+                    self._dropped_per_code.get(msg_code, 0) + 1
+                )
+                return
+            self._kept_per_code[msg_code] = kept + 1
+
+        msg = self._messages_by_key[key] = ForestLogger.Message(
+            msg_code=msg_code,
+            msg_content=msg_content,
+            problem_datablock=problem_datablock,
+            msg_context=msg_context,
+            msg_category=msg_category,
+            problem_datablocks=(
+                [problem_datablock]
+                if problem_datablock is not None and self.max_samples
+                else []
+            ),
+        )
+        self._messages.append(msg)
+        self._messages_by_type[msg_type].append(msg)
+        for transport in self.transports:
+            transport(msg)
+
+    @property
+    def dropped_counts(self) -> Dict[MessageCodes, int]:
+        """How many warnings and errors of each code max_per_code didn't keep"""
+        return self._dropped_per_code.copy()
+
+    def warn_dropped(self) -> None:
+        """Logs a W004 for each code that had messages dropped by max_per_code"""
+        for code, dropped_count in self.dropped_counts.items():
+            self.warn(
+                MessageCodes.W004,
+                f"{dropped_count} more {code.name} messages were not logged,"
+                f" fix the ones above first",
+                None,
             )
-            self._messages.append(msg)
-            for transport in self.transports:
-                transport(msg)
-        else:
-            pass
+
+    def debug(
+        self,
+        code: MessageCodes,
+        message: Union[str, Callable[[], str]],
+        problem_datablock: Optional[bpy.types.Object],
+        context=None,
+        category: MessageCategories = MessageCategories.GENERAL,
+    ):
+        self.log(code, message, problem_datablock, context, category)
 
     def error(
         self,
@@ -197,25 +492,61 @@ class ForestLogger(metaclass=_Singleton):
     ):
         self.log(code, message, problem_datablock, context)
 
+    def flush(self) -> None:
+        """
+        Makes every buffered transport write what it's holding,
+        call at the end of each phase of an export.
+
+        A transport that can't write (raises OSError) is removed
+        and a W003 warning is logged to the others
+        """
+        for transport in self.transports.copy():
+            flush = getattr(transport, "flush", None)
+            if not flush:
+                continue
+            try:
+                flush()
+            except OSError as e:
+                self.transports.remove(transport)
+                self.warn(
+                    MessageCodes.W003,
+                    f"Could not write the log file '{getattr(transport, 'path', '')}':"
+                    f" {e.strerror or e}, it won't have the rest of this export",
+                    None,
+                )
+                self.flush()
+                return
+
     @property
     def messages(self):
         return self._messages.copy()
 
+    def count(self, msg_type: MessageTypes) -> int:
+        """
+        How many different messages of msg_type have been kept since the last reset,
+        repeats aren't counted
+        """
+        return len(self._messages_by_type[msg_type])
+
+    @property
+    def has_errors(self) -> bool:
+        return bool(self._messages_by_type[MessageTypes.ERROR])
+
     @property
     def infos(self):
-        return [m for m in self.messages if m.msg_type == MessageTypes.INFO]
+        return self._messages_by_type[MessageTypes.INFO].copy()
 
     @property
     def warnings(self):
-        return [m for m in self.messages if m.msg_type == MessageTypes.SUCCESS]
+        return self._messages_by_type[MessageTypes.WARNING].copy()
 
     @property
     def errors(self):
-        return [m for m in self.messages if m.msg_type == MessageTypes.ERROR]
+        return self._messages_by_type[MessageTypes.ERROR].copy()
 
     @property
     def successes(self):
-        return [m for m in self.messages if m.msg_type == MessageTypes.SUCCESS]
+        return self._messages_by_type[MessageTypes.SUCCESS].copy()
 
 
 logger = ForestLogger()
@@ -0,0 +1,245 @@
+"""
+Times each phase of an export, per forest and per mesh, and writes what it
+found as a JSON report. Optionally also traces memory, or captures everything
+with cProfile.
+
+Nothing here may use bpy
+"""
+import contextlib
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List, Optional
+
+# The phases of an export
+ROOT_DISCOVERY = "root_discovery"
+TREE_CLASSIFICATION = "tree_classification"
+HEADER_COLLECTION = "header_collection"
+MESH_TABLE = "mesh_table"
+WRITE = "write"
+
+# Set to anything but "" or "0" to capture a cProfile, see Profiler
+CPROFILE_ENV_VAR = "XPLANE_FOR_CPROFILE"
+
+
+def cprofile_requested() -> bool:
+    """True if CPROFILE_ENV_VAR asks for a cProfile capture"""
+    return os.environ.get(CPROFILE_ENV_VAR, "0") not in ("", "0")
+
+
+class _Timing:
+    """The totals of every run of a phase, in seconds and bytes"""
+
+    __slots__ = ("count", "wall", "cpu", "peak_bytes")
+
+    def __init__(self):
+        self.count = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        # Largest across runs, None unless tracing memory
+        self.peak_bytes: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {"count": self.count, "wall": self.wall, "cpu": self.cpu}
+        if self.peak_bytes is not None:
+            d["peak_bytes"] = self.peak_bytes
+        return d
+
+
+class _Frame:
+    """A phase being run"""
+
+    __slots__ = ("start_wall", "start_cpu", "start_traced", "peak_traced")
+
+    def __init__(self, trace_memory: bool):
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.start_traced = self.peak_traced = (
+            tracemalloc.get_traced_memory()[0] if trace_memory else 0
+        )
+
+
+class Profiler:
+    """
+    Records the wall and CPU time of phases, by forest and mesh:
+
+        with profiler.phase(forest_profiler.MESH_TABLE, forest_name, mesh_name):
+            ...
+
+    Phases may nest. If trace_memory, each phase's peak of memory allocated
+    beyond what was allocated when it started is recorded too, with tracemalloc.
+    If use_cprofile (or CPROFILE_ENV_VAR is set), everything between start
+    and stop is also captured with cProfile, see write_cprofile.
+
+    A Profiler that isn't enabled records nothing and costs next to nothing
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        trace_memory: bool = False,
+        use_cprofile: bool = False,
+    ):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.use_cprofile = enabled and (use_cprofile or cprofile_requested())
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._started_tracemalloc = False
+        self._total: Optional[_Frame] = None
+        self._total_timing = _Timing()
+        self._stack: List[_Frame] = []
+        # Keyed by phase
+        self._phases: Dict[str, _Timing] = {}
+        # Keyed by forest, then phase
+        self._forests: Dict[str, Dict[str, _Timing]] = {}
+        # Keyed by forest, then mesh, then phase
+        self._meshes: Dict[str, Dict[str, Dict[str, _Timing]]] = {}
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.use_cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._total = self._enter()
+
+    def stop(self) -> None:
+        """Stops timing the export, and tracing or profiling if start started them"""
+        if not self.enabled or self._total is None:
+            return
+        self._exit(self._total, [self._total_timing])
+        self._total = None
+        if self._cprofile:
+            self._cprofile.disable()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextlib.contextmanager
+    def phase(
+        self, name: str, forest: Optional[str] = None, mesh: Optional[str] = None
+    ) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        timings = [self._phases.setdefault(name, _Timing())]
+        if forest is not None:
+            timings.append(
+                self._forests.setdefault(forest, {}).setdefault(name, _Timing())
+            )
+            if mesh is not None:
+                timings.append(
+                    self._meshes.setdefault(forest, {})
+                    .setdefault(mesh, {})
+                    .setdefault(name, _Timing())
+                )
+        frame = self._enter()
+        try:
+            yield
+        finally:
+            self._exit(frame, timings)
+
+    def record(
+        self,
+        name: str,
+        wall: float,
+        cpu: float,
+        forest: str,
+        mesh: Optional[str] = None,
+    ) -> None:
+        """
+        Adds a run of a phase timed elsewhere, like in a worker process,
+        to forest's (and mesh's) timings. The phase's own total is left to
+        the phase running here while the work happened
+        """
+        if not self.enabled:
+            return
+        timings = [self._forests.setdefault(forest, {}).setdefault(name, _Timing())]
+        if mesh is not None:
+            timings.append(
+                self._meshes.setdefault(forest, {})
+                .setdefault(mesh, {})
+                .setdefault(name, _Timing())
+            )
+        for timing in timings:
+            timing.count += 1
+            timing.wall += wall
+            timing.cpu += cpu
+
+    def _enter(self) -> _Frame:
+        if self.trace_memory:
+            # The peak is about to be reset, the running phase keeps its own
+            if self._stack:
+                self._stack[-1].peak_traced = max(
+                    self._stack[-1].peak_traced, tracemalloc.get_traced_memory()[1]
+                )
+            if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+                tracemalloc.reset_peak()
+        frame = _Frame(self.trace_memory)
+        self._stack.append(frame)
+        return frame
+
+    def _exit(self, frame: _Frame, timings: List[_Timing]) -> None:
+        wall = time.perf_counter() - frame.start_wall
+        cpu = time.process_time() - frame.start_cpu
+        self._stack.remove(frame)
+        peak_bytes = None
+        if self.trace_memory:
+            frame.peak_traced = max(
+                frame.peak_traced, tracemalloc.get_traced_memory()[1]
+            )
+            peak_bytes = frame.peak_traced - frame.start_traced
+            if self._stack:
+                self._stack[-1].peak_traced = max(
+                    self._stack[-1].peak_traced, frame.peak_traced
+                )
+        for timing in timings:
+            timing.count += 1
+            timing.wall += wall
+            timing.cpu += cpu
+            if peak_bytes is not None:
+                timing.peak_bytes = max(timing.peak_bytes or 0, peak_bytes)
+
+    def report(self) -> Dict[str, Any]:
+        """Everything recorded so far, as JSON-able dicts. Times are in seconds"""
+        return {
+            "total": self._total_timing.to_dict(),
+            "phases": {
+                name: timing.to_dict() for name, timing in self._phases.items()
+            },
+            "forests": {
+                forest: {
+                    "phases": {
+                        name: timing.to_dict() for name, timing in phases.items()
+                    },
+                    "meshes": {
+                        mesh: {
+                            name: timing.to_dict()
+                            for name, timing in mesh_phases.items()
+                        }
+                        for mesh, mesh_phases in self._meshes.get(forest, {}).items()
+                    },
+                }
+                for forest, phases in self._forests.items()
+            },
+        }
+
+    def write_report(self, path: str) -> None:
+        """Writes report to path as JSON. Raises OSError"""
+        with open(path, "w") as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+    def write_cprofile(self, path: str) -> bool:
+        """
+        Writes the cProfile capture to path, for pstats or snakeviz.
+        Returns False if there's no capture. Raises OSError
+        """
+        if not self._cprofile:
+            return False
+        self._cprofile.dump_stats(path)
+        return True
@@ -0,0 +1,175 @@
+"""
+Plain copies of the .for property groups in forest_props, read through RNA
+once per datablock per export instead of once per use.
+
+ExportContext makes and keeps these, get them from it.
+Nothing here may use bpy
+"""
+from typing import Any, Optional, Tuple
+
+from io_scene_xplane_for import forest_constants
+
+
+class _Snapshot:
+    """Copies every attribute in __slots__ from a property group, arrays as tuples"""
+
+    __slots__ = ()
+
+    def __init__(self, property_group: Any):
+        for name in self.__slots__:
+            value = getattr(property_group, name)
+            if not isinstance(value, (bool, int, float, str)):
+                value = tuple(value)
+            setattr(self, name, value)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class TreeSettings(_Snapshot):
+    """Of an Object's xplane_for.tree"""
+
+    __slots__ = (
+        "weighted_importance",
+        "max_height",
+        "use_custom_lod",
+        "custom_lod",
+        "tree_group",
+    )
+    weighted_importance: int
+    max_height: float
+    use_custom_lod: bool
+    custom_lod: int
+    tree_group: int
+
+    def __init__(self, property_group: Any):
+        super().__init__(property_group)
+        self.tree_group = int(self.tree_group)
+
+
+class MaterialSettings(_Snapshot):
+    """Of a Material's xplane_for"""
+
+    __slots__ = (
+        "texture_path",
+        "texture_path_normal",
+        "texture_path_normal_ratio",
+        "texture_path_weather",
+        "has_luma_values",
+        "luma_values",
+        "blend_mode",
+        "no_blend_level",
+        "blend_hash_level",
+        "has_specular",
+        "specular",
+        "has_bump_level",
+        "bump_level",
+        "no_shadow",
+        "shadow_blend",
+        "normal_mode",
+    )
+    texture_path: str
+    texture_path_normal: str
+    texture_path_normal_ratio: float
+    texture_path_weather: str
+    has_luma_values: bool
+    luma_values: Tuple[float, float, float, float]
+    blend_mode: str
+    no_blend_level: float
+    blend_hash_level: float
+    has_specular: bool
+    specular: float
+    has_bump_level: bool
+    bump_level: float
+    no_shadow: bool
+    shadow_blend: bool
+    normal_mode: str
+
+
+class MeshSettings(_Snapshot):
+    """Of a Mesh's xplane_for"""
+
+    __slots__ = (
+        "lod_near",
+        "lod_far",
+        "wind_bend_ratio",
+        "branch_stiffness",
+        "wind_speed",
+        "no_shadow",
+    )
+    lod_near: int
+    lod_far: int
+    wind_bend_ratio: float
+    branch_stiffness: float
+    wind_speed: float
+    no_shadow: bool
+
+
+class ForestSettings(_Snapshot):
+    """
+    Of a Collection's xplane_for.forest.
+
+    Each perlin_* is the 4 amplitude and wavelength pairs flattened,
+    or None when its has_perlin_* is off
+    """
+
+    __slots__ = (
+        "has_perlin_density",
+        "has_perlin_choice",
+        "has_perlin_height",
+        "cast_shadow",
+        "has_seasons",
+        "has_max_lod",
+        "max_lod",
+        "randomness",
+        "spacing",
+        *(
+            f"skip_surface_{surface_type}"
+            for surface_type in forest_constants.SURFACE_TYPES
+        ),
+        "perlin_density",
+        "perlin_choice",
+        "perlin_height",
+    )
+    has_perlin_density: bool
+    has_perlin_choice: bool
+    has_perlin_height: bool
+    cast_shadow: bool
+    has_seasons: bool
+    has_max_lod: bool
+    max_lod: int
+    randomness: Tuple[float, float]
+    spacing: Tuple[float, float]
+    perlin_density: Optional[Tuple[float, ...]]
+    perlin_choice: Optional[Tuple[float, ...]]
+    perlin_height: Optional[Tuple[float, ...]]
+
+    def __init__(self, property_group: Any):
+        for name in self.__slots__:
+            if name.startswith("perlin_"):
+                perlin_group = getattr(property_group, name)
+                value = (
+                    (
+                        *perlin_group.wavelength_amp_1,
+                        *perlin_group.wavelength_amp_2,
+                        *perlin_group.wavelength_amp_3,
+                        *perlin_group.wavelength_amp_4,
+                    )
+                    if getattr(property_group, "has_" + name)
+                    else None
+                )
+            else:
+                value = getattr(property_group, name)
+                if not isinstance(value, (bool, int, float, str)):
+                    value = tuple(value)
+            setattr(self, name, value)
+
+    @property
+    def skip_surfaces(self) -> Tuple[str, ...]:
+        """The forest_constants.SURFACE_TYPES trees don't appear on"""
+        return tuple(
+            surface_type
+            for surface_type in forest_constants.SURFACE_TYPES
+            if getattr(self, f"skip_surface_{surface_type}")
+        )
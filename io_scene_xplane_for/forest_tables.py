@@ -1,17 +1,24 @@
 import pprint
+import hashlib
 import itertools
-import dataclasses
-from typing import Any, Iterable, List, Tuple, Dict, Optional, Union
+from typing import Iterable, List, NamedTuple, Tuple, Dict, Optional, Union
 
 import bpy
 import mathutils
+import numpy
 
-from io_scene_xplane_for import forest_file, forest_helpers
+from io_scene_xplane_for import (
+    forest_constants,
+    forest_context,
+    forest_file,
+    forest_helpers,
+    forest_ir,
+    forest_snapshots,
+)
 from io_scene_xplane_for.forest_logger import logger, MessageCodes
 
 
-@dataclasses.dataclass(eq=True, frozen=True)
-class _TmpFace:
+class _TmpFace(NamedTuple):
     original_face: bpy.types.MeshLoopTriangle
     indices: Tuple[float, float, float]
     normals: Tuple[float, float, float]
@@ -23,57 +30,175 @@ class _TmpFace:
     uvs: Tuple[mathutils.Vector, mathutils.Vector, mathutils.Vector]
 
 
-@dataclasses.dataclass(eq=True, frozen=True)
-class _TmpVert:
-    location: mathutils.Vector
-    normal: mathutils.Vector
-    s: int
-    t: int
+class _TmpVert(NamedTuple):
+    """
+    A VERTEX row as a flat tuple of floats, the same as a row of MeshIR.vertices.
+    Compares -0.0 and 0.0 as equal, like the frozen mathutils.Vectors it replaced
+    """
+
+    x: float
+    y: float
+    z: float
+    nx: float
+    ny: float
+    nz: float
+    s: float
+    t: float
     w_stiffness: float
     w_edge_stiffness: float
     w_phase: float
 
-    def __str__(self) -> str:
-        return f"VERTEX\t" + "\t".join(
-            (
-                " ".join(map(forest_helpers.floatToStr, self.location)),
-                " ".join(map(forest_helpers.floatToStr, self.normal)),
-                *map(
-                    forest_helpers.floatToStr,
-                    [
-                        self.s,
-                        self.t,
-                        self.w_stiffness,
-                        self.w_edge_stiffness,
-                        self.w_phase,
-                    ],
-                ),
-            )
-        )
-
 
-def write_mesh_table(complex_object: bpy.types.Object) -> str:
+def collect_mesh_table(
+    complex_object: bpy.types.Object,
+    export_context: "forest_context.ExportContext",
+) -> forest_ir.MeshIR:
     """
-    Returns the MESH.... VERTEX.... IDX.... table for one object
+    Returns what's needed for the MESH.... VERTEX.... IDX.... table of one object.
+
+    The export context's mesh engine builds the table, all engines
+    produce the same result. If it has a mesh table cache, a MeshIR already made
+    from the same evaluated geometry and mesh settings is reused
     """
     # TODO needs validation that
     mesh_name = complex_object.name
+    mesh_settings = export_context.get_mesh_settings(complex_object.data)
+    cache = export_context.mesh_table_cache
 
-    vertices: List[Tuple[Any]] = []
-    indices: List[int] = []
-
-    dg = bpy.context.evaluated_depsgraph_get()
-    eval_obj = complex_object.evaluated_get(dg)
-    mesh = eval_obj.to_mesh(preserve_all_data_layers=False, depsgraph=dg)
+    eval_obj = export_context.get_evaluated_object(complex_object)
+    mesh = export_context.get_evaluated_mesh(complex_object)
     mesh.calc_normals_split()
+    try:
+        uv_layer = mesh.uv_layers[eval_obj.data.uv_layers.active.name]
+    except (KeyError, TypeError) as e:
+        uv_layer = None
+    wind_weights = get_wind_weights(complex_object, mesh)
+
+    if cache is not None:
+        cache_key = _make_mesh_table_key(
+            complex_object, mesh_settings, mesh, uv_layer, wind_weights
+        )
+        mesh_ir = cache.get(cache_key)
+        if mesh_ir is not None:
+            return mesh_ir
+
     mesh.calc_loop_triangles()
+    if export_context.mesh_engine == forest_constants.MESH_ENGINE_NUMPY:
+        vertex_rows, indices = _make_vertex_table_numpy(mesh, uv_layer, wind_weights)
+    else:
+        vertices, indices = _make_vertex_table_python(mesh, uv_layer, wind_weights)
+        vertex_rows = numpy.array(vertices, dtype=numpy.float32).reshape(-1, 11)
 
-    def make_tmp_faces(mesh: bpy.types.Mesh) -> Iterable[_TmpFace]:
-        try:
-            uv_layer = mesh.uv_layers[eval_obj.data.uv_layers.active.name]
-        except (KeyError, TypeError) as e:
-            uv_layer = None
+    mesh_ir = forest_ir.MeshIR(
+        name=complex_object.data.name,
+        lod_near=mesh_settings.lod_near,
+        lod_far=mesh_settings.lod_far,
+        wind_bend_ratio=mesh_settings.wind_bend_ratio,
+        branch_stiffness=mesh_settings.branch_stiffness,
+        wind_speed=mesh_settings.wind_speed,
+        no_shadow=mesh_settings.no_shadow,
+        vertices=vertex_rows,
+        indices=numpy.asarray(indices, dtype=numpy.int32),
+        shared=cache is not None,
+    )
+    if cache is not None:
+        cache.put(cache_key, mesh_ir)
+    return mesh_ir
+
+
+def get_wind_weights(
+    complex_object: bpy.types.Object, mesh: bpy.types.Mesh
+) -> numpy.ndarray:
+    """
+    Returns a (len(mesh.vertices), 3) float32 array of every vertex's weight
+    in each of forest_constants.WIND_WEIGHT_GROUPS, 0 when not in the group.
+
+    Vertex group names are resolved once per mesh, not once per vertex
+    """
+    weights = numpy.zeros(
+        (len(mesh.vertices), len(forest_constants.WIND_WEIGHT_GROUPS)),
+        dtype=numpy.float32,
+    )
+    # Maps vertex group index to column in weights
+    columns: Dict[int, int] = {
+        vertex_group.index: forest_constants.WIND_WEIGHT_GROUPS.index(
+            vertex_group.name
+        )
+        for vertex_group in complex_object.vertex_groups
+        if vertex_group.name in forest_constants.WIND_WEIGHT_GROUPS
+    }
+    if not columns:
+        return weights
+
+    for vertex in mesh.vertices:
+        for g in vertex.groups:
+            column = columns.get(g.group)
+            if column is not None:
+                weights[vertex.index, column] = g.weight
+    return weights
+
+
+def _make_mesh_table_key(
+    complex_object: bpy.types.Object,
+    mesh_settings: forest_snapshots.MeshSettings,
+    mesh: bpy.types.Mesh,
+    uv_layer: Optional[bpy.types.MeshUVLoopLayer],
+    wind_weights: numpy.ndarray,
+) -> Tuple[str, str]:
+    """
+    Returns the mesh's name and a digest of everything its MESH table is made
+    from: the evaluated geometry, split normals, UVs, wind weights and
+    mesh_settings. mesh must already have its split normals calculated
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(
+        repr(
+            (
+                len(mesh.vertices),
+                len(mesh.polygons),
+                len(mesh.loops),
+                bool(uv_layer),
+                mesh_settings.lod_near,
+                mesh_settings.lod_far,
+                mesh_settings.wind_bend_ratio,
+                mesh_settings.branch_stiffness,
+                mesh_settings.wind_speed,
+                mesh_settings.no_shadow,
+            )
+        ).encode()
+    )
+
+    def update(collection, attr: str, dtype, size: int) -> None:
+        values = numpy.empty(len(collection) * size, dtype=dtype)
+        collection.foreach_get(attr, values)
+        digest.update(values.tobytes())
+
+    update(mesh.vertices, "co", numpy.float32, 3)
+    update(mesh.polygons, "loop_start", numpy.int32, 1)
+    update(mesh.polygons, "loop_total", numpy.int32, 1)
+    update(mesh.polygons, "normal", numpy.float32, 3)
+    update(mesh.polygons, "use_smooth", bool, 1)
+    update(mesh.loops, "vertex_index", numpy.int32, 1)
+    update(mesh.loops, "normal", numpy.float32, 3)
+    if uv_layer:
+        update(uv_layer.data, "uv", numpy.float32, 2)
+    digest.update(wind_weights.tobytes())
+    return complex_object.data.name, digest.hexdigest()
+
+
+def _make_vertex_table_python(
+    mesh: bpy.types.Mesh,
+    uv_layer: Optional[bpy.types.MeshUVLoopLayer],
+    wind_weights: numpy.ndarray,
+) -> Tuple[List[_TmpVert], List[int]]:
+    """
+    Returns the deduplicated vertex table and the indices into it,
+    one triangle corner at a time
+    """
+    vertices: List[_TmpVert] = []
+    indices: List[int] = []
 
+    def make_tmp_faces(mesh: bpy.types.Mesh) -> Iterable[_TmpFace]:
         for tri in mesh.loop_triangles:
             uvs = (
                 tuple(uv_layer.data[loop_index].uv for loop_index in tri.loops)
@@ -90,13 +215,13 @@ def write_mesh_table(complex_object: bpy.types.Object) -> str:
                 split_normals=tri.split_normals,
                 uvs=uvs,
             )
-        eval_obj.to_mesh_clear()
+
+    wind_weights: List[List[float]] = wind_weights.tolist()
 
     # This could have been a set,
     # but keeping track of the associated indicies is nice
-    all_verts_encountered: Dict[_TmpFace, int] = {}
+    all_verts_encountered: Dict[_TmpVert, int] = {}
     next_idx: int = 0
-
     for tmp_face in make_tmp_faces(mesh):
         # To reverse the winding order for X-Plane from CCW to CW,
         # we iterate backwards through the mesh data structures
@@ -111,27 +236,16 @@ def write_mesh_table(complex_object: bpy.types.Object) -> str:
                     else tmp_face.normals
                 )
                 uv = tmp_face.uvs[i]
-                v_groups: Dict[str, float] = {
-                    complex_object.vertex_groups[g.group].name: g.weight
-                    for g in mesh.vertices[vt_index].groups
-                }
-
-                def get_w(vgroup_name: str) -> float:
-                    try:
-                        w = v_groups[vgroup_name]
-                    except KeyError:
-                        return 0
-                    else:
-                        return w
+                w_stiffness, w_edge_stiffness, w_phase = wind_weights[vt_index]
 
                 vt_entry = _TmpVert(
-                    location=vertex.freeze(),
-                    normal=normal.freeze(),
-                    s=uv[0],
-                    t=uv[1],
-                    w_stiffness=get_w("w_stiffness"),
-                    w_edge_stiffness=get_w("w_edge_stiffness"),
-                    w_phase=get_w("w_phase"),
+                    *vertex,
+                    *normal,
+                    uv[0],
+                    uv[1],
+                    w_stiffness,
+                    w_edge_stiffness,
+                    w_phase,
                 )
                 return vt_entry
 
@@ -145,35 +259,74 @@ def write_mesh_table(complex_object: bpy.types.Object) -> str:
                 vertices.append(vt_entry)
                 next_idx += 1
 
-    o = ""
-    o += "\n"
-    if complex_object.data.xplane_for.no_shadow: sh = "NO_SHADOW"
-    else: sh = ""
-    o += (
-        "\t".join(
-            (
-                f"MESH",
-                f"{complex_object.data.name}",
-                f"{complex_object.data.xplane_for.lod_near}",
-                f"{complex_object.data.xplane_for.lod_far}",
-                f"{len(vertices)}",
-                f"{len(indices)}",
-                f"{complex_object.data.xplane_for.wind_bend_ratio}",
-                f"{complex_object.data.xplane_for.branch_stiffness}",
-                f"{complex_object.data.xplane_for.wind_speed}",
-                f"{sh}",
-            )
-        )
-        + "\n"
+    return vertices, indices
+
+
+def _make_vertex_table_numpy(
+    mesh: bpy.types.Mesh,
+    uv_layer: Optional[bpy.types.MeshUVLoopLayer],
+    wind_weights: numpy.ndarray,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Returns the deduplicated vertex table, as a (n, 11) float32 array of
+    location, normal, s, t, w_stiffness, w_edge_stiffness, w_phase,
+    and the indices into it.
+
+    Matches _make_vertex_table_python exactly: same winding,
+    same vertex order, same values
+    """
+    tri_count = len(mesh.loop_triangles)
+
+    locations = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+    mesh.vertices.foreach_get("co", locations)
+    loop_normals = numpy.empty(len(mesh.loops) * 3, dtype=numpy.float32)
+    mesh.loops.foreach_get("normal", loop_normals)
+
+    tri_vertices = numpy.empty(tri_count * 3, dtype=numpy.int32)
+    mesh.loop_triangles.foreach_get("vertices", tri_vertices)
+    tri_loops = numpy.empty(tri_count * 3, dtype=numpy.int32)
+    mesh.loop_triangles.foreach_get("loops", tri_loops)
+    tri_normals = numpy.empty(tri_count * 3, dtype=numpy.float32)
+    mesh.loop_triangles.foreach_get("normal", tri_normals)
+    tri_smooth = numpy.empty(tri_count, dtype=bool)
+    mesh.loop_triangles.foreach_get("use_smooth", tri_smooth)
+
+    # To reverse the winding order for X-Plane from CCW to CW,
+    # we read every triangle's corners backwards
+    corner_vertices = tri_vertices.reshape(-1, 3)[:, ::-1].ravel()
+    corner_loops = tri_loops.reshape(-1, 3)[:, ::-1].ravel()
+
+    rows = numpy.empty((tri_count * 3, 11), dtype=numpy.float32)
+    rows[:, 0:3] = locations.reshape(-1, 3)[corner_vertices]
+    rows[:, 3:6] = numpy.where(
+        numpy.repeat(tri_smooth, 3)[:, numpy.newaxis],
+        loop_normals.reshape(-1, 3)[corner_loops],
+        numpy.repeat(tri_normals.reshape(-1, 3), 3, axis=0),
     )
-    o += "\n".join(str(vt_entry) for vt_entry in vertices) + "\n"
-    o += (
-        "\n".join(
-            # Thanks Steg! So concise:
-            # https://stackoverflow.com/questions/1624883/alternative-way-to-split-a-list-into-groups-of-n/1624988#1624988
-            ("IDX\t" + "\t".join(map(str, indices[i : i + 10])))
-            for i in range(0, len(indices), 10)
-        )
-        + "\n"
+    # vec_b_to_x, in bulk
+    for first in (0, 3):
+        rows[:, first + 1 : first + 3] = rows[:, [first + 2, first + 1]]
+        rows[:, first + 2] *= -1
+
+    if uv_layer:
+        uvs = numpy.empty(len(mesh.loops) * 2, dtype=numpy.float32)
+        uv_layer.data.foreach_get("uv", uvs)
+        rows[:, 6:8] = uvs.reshape(-1, 2)[corner_loops]
+    else:
+        rows[:, 6:8] = 0
+
+    rows[:, 8:11] = wind_weights[corner_vertices]
+
+    # Float fields compare -0.0 and 0.0 as equal, exactly like
+    # the float tuples in _TmpVert do
+    rows_view = rows.view(
+        numpy.dtype([(f"f{i}", numpy.float32) for i in range(11)])
+    ).ravel()
+    _, first_seen, inverse = numpy.unique(
+        rows_view, return_index=True, return_inverse=True
     )
-    return o
+    # numpy.unique sorts, but X-Plane wants vertices in the order first seen
+    order = numpy.argsort(first_seen)
+    new_index = numpy.empty_like(order)
+    new_index[order] = numpy.arange(len(order))
+    return rows[first_seen[order]], new_index[inverse.ravel()]
@@ -1,89 +1,35 @@
-import dataclasses
 import functools
 import itertools
 import math
 import operator
-import pathlib
 from operator import attrgetter
 from pprint import pprint
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
 
-import bmesh
 import bpy
 import mathutils
+import numpy
 
-from io_scene_xplane_for import forest_helpers
-from io_scene_xplane_for.forest_logger import MessageCodes, logger
-
-
-@dataclasses.dataclass
-class TreeStruct:
-    s: int
-    t: int
-    w: int
-    h: int
-    offset: int
-    freq: float  # This is filled in later when all trees are collected
-    min_height: float
-    max_height: float
-    quads: int
-    layer_number: int
-    notes: str
-
-    def __post_init__(self):
-        for attr, factory in type(self).__annotations__.items():
-            try:
-                setattr(self, attr, factory(getattr(self, attr)))
-            except ValueError:
-                print(
-                    f"Couldn't convert '{attr}''s value ({getattr(self, attr)}) with {factory}"
-                )
-
-    def __str__(self) -> str:
-        def fmt(s):
-            try:
-                return forest_helpers.floatToStr(float(s))
-            except (TypeError, ValueError):
-                return s
-
-        return "\t".join(
-            fmt(value)
-            for attr, value in vars(self).items()
-            if not attr.startswith("__")
-        )
+from io_scene_xplane_for import forest_context, forest_helpers, forest_ir
+from io_scene_xplane_for.forest_ir import TreeStruct, YQuadStruct
+from io_scene_xplane_for.forest_logger import MessageCategories, MessageCodes, logger
 
 
-@dataclasses.dataclass
-class YQuadStruct:
-    s: int
-    t: int
-    w: int
-    h: int
-    offset_center_x: int
-    offset_center_y: int
-    quad_width: int  # pixels, relative to vertical tree
-    elevation: int  # pixels, relative to vertical tree
-    psi_rotation: float
-
-    def __post_init__(self):
-        for attr, factory in type(self).__annotations__.items():
-            try:
-                setattr(self, attr, factory(getattr(self, attr)))
-            except ValueError:
-                assert (
-                    False
-                ), f"Couldn't convert '{attr}''s value ({getattr(self, attr)}) with {factory}"
-
-    def __str__(self) -> str:
-        return "\t".join(
-            str(value)
-            for attr, value in vars(self).items()
-            if not attr.startswith("__")
-        )
+# What a child of a tree container is, see ForestTree.__init__'s classify
+_CHILD_VERTICAL_QUAD = "VERTICAL_QUAD"
+_CHILD_HORIZONTAL_QUAD = "HORIZONTAL_QUAD"
+_CHILD_OTHER_QUAD = "OTHER_QUAD"
+_CHILD_COMPLEX = "COMPLEX"
+_CHILD_UNKNOWN = "UNKNOWN"
 
 
 class ForestTree:
-    def __init__(self, tree_container: bpy.types.Object, layer_number: int):
+    def __init__(
+        self,
+        tree_container: bpy.types.Object,
+        layer_number: int,
+        export_context: "forest_context.ExportContext",
+    ):
         self.tree_container: bpy.types.Object = tree_container
         self.vert_info = TreeStruct(*([0] * 11))
         self.vert_quad: bpy.types.Object = None
@@ -91,56 +37,30 @@ class ForestTree:
         self.horz_info = YQuadStruct(*([0] * 9))
         self.horz_quad: Optional[bpy.types.Object] = None
         self.complex_objects: List[bpy.types.Object] = []
-        self.weighted_importance = (
-            self.tree_container.xplane_for.tree.weighted_importance
-        )
-
-        depsgraph = bpy.context.evaluated_depsgraph_get()
+        self.tree_settings = export_context.get_tree_settings(tree_container)
+        self.weighted_importance = self.tree_settings.weighted_importance
+        self.tree_group = self.tree_settings.tree_group
 
         def fmt_vec(v, ndigits=2) -> str:
             v = tuple(v)
             return ", ".join(f"{c:02f}" for c in v)
 
-        print("Handling", tree_container.name)
-
-        def get_bmesh_from_obj(obj: bpy.types.Object) -> bmesh.types.BMesh:
-            """
-            Returns a bmesh from an object's evaluated mesh,
-            users of the function should call free when done with this
-            """
-            b = bmesh.new()
-            object_eval = obj.evaluated_get(depsgraph)
-            mesh_eval = object_eval.to_mesh(
-                preserve_all_data_layers=False, depsgraph=depsgraph
-            )
-
-            b.from_mesh(mesh_eval)
-            b.transform(object_eval.matrix_world)
-            object_eval.to_mesh_clear()
-            return b
+        logger.debug(
+            MessageCodes.D000,
+            lambda: f"Handling {tree_container.name}",
+            tree_container,
+            category=MessageCategories.TREE,
+        )
 
         def mesh_is_rectangle(obj: bpy.types.Object) -> bool:
-            b = get_bmesh_from_obj(obj)
-            try:
-                if len(b.edges) == 4 and all(
-                    (
-                        round(v.calc_edge_angle(), 5) == round(math.radians(90), 5)
-                        for v in b.verts
-                    )
-                ):
-                    edge_lengths = [round(e.calc_length(), 5) for e in b.edges]
-                    if (
-                        edge_lengths[0] == edge_lengths[2]
-                        and edge_lengths[1] == edge_lengths[3]
-                    ):
-                        return True
-            except ValueError:  # calc_edge_angle failed, for instance, over a cube
-                return False
-            else:
-                # print(obj.name, "is not a rectangle")
+            mesh_eval = export_context.get_evaluated_mesh(obj)
+            # Fast reject, nothing else can be 4 edges at right angles
+            if len(mesh_eval.vertices) != 4 or len(mesh_eval.edges) != 4:
                 return False
-            finally:
-                b.free()
+            return _is_rectangle(
+                export_context.get_vertex_coordinates(obj, world=True),
+                export_context.get_edge_vertices(obj),
+            )
 
         def verts_from_edge_global(
             edge: bpy.types.MeshEdge,
@@ -153,48 +73,59 @@ class ForestTree:
             )
 
         def mesh_is_vertical(obj: bpy.types.Object):
-            b = get_bmesh_from_obj(obj)
-
-            bl, tl, br, tr = sorted(
-                map(lambda v: forest_helpers.round_vec(v.co), b.verts),
-                key=lambda v: tuple(v),
-            )
-
-            ret = (
-                all(round(v.z, 5) == 0 for v in [bl, br])
-                and all(round(v.z, 5) > 0 for v in [tl, tr])
-                and tl.x == bl.x
-                and tr.x == br.x
-            )
-            b.free()
-            return ret
+            return _is_vertical(export_context.get_vertex_coordinates(obj, world=True))
 
         def mesh_is_horizontal(obj: bpy.types.Object):
-            object_eval = obj.evaluated_get(depsgraph)
-            ret = len(set(round(v.co.z, 5) for v in object_eval.data.vertices)) == 1
-            object_eval.to_mesh_clear()
-            return ret
+            return _is_horizontal(export_context.get_vertex_coordinates(obj))
 
-        for child in forest_helpers.get_all_children_recursive(self.tree_container):
+        def classify(obj: bpy.types.Object) -> str:
+            """Returns one of _CHILD_*"""
+            # Linked duplicates share their shape, but not whether
+            # they stand straight up, that's checked for each of them
+            key = _get_linked_duplicate_key(obj)
+            try:
+                kind = export_context.child_kinds[key]
+            except KeyError:
+                if mesh_is_rectangle(obj):
+                    if mesh_is_horizontal(obj):
+                        kind = _CHILD_HORIZONTAL_QUAD
+                    else:
+                        kind = _CHILD_OTHER_QUAD
+                elif len(obj.data.polygons) > 1:
+                    kind = _CHILD_COMPLEX
+                else:
+                    kind = _CHILD_UNKNOWN
+                if key is not None:
+                    export_context.child_kinds[key] = kind
+
+            is_quad = kind in {_CHILD_HORIZONTAL_QUAD, _CHILD_OTHER_QUAD}
+            if is_quad and mesh_is_vertical(obj):
+                return _CHILD_VERTICAL_QUAD
+            return kind
+
+        for child in export_context.children_index.get_descendants(
+            self.tree_container
+        ):
             if child.type in {"ARMATURE", "EMPTY"}:
                 continue
-            elif mesh_is_rectangle(child):
-                if mesh_is_vertical(child):
-                    print(f"{child.name} is vertical")
-                    self.vert_info.quads += 1
-                    # TODO: must ensure that both quads are identical,
-                    # but rotated at 90 degrees or only pick the first one you see
-                    self.vert_quad = child
-                elif mesh_is_horizontal(child):
-                    print(child.name, "is horizontal")
-                    self.horz_quad = child
-                else:
-                    pass
-            elif len(child.data.polygons) > 1:
-                print(f"{child.name} is complex")
+            kind = classify(child)
+            logger.debug(
+                MessageCodes.D001,
+                lambda: f"{child.name} is {kind}",
+                child,
+                category=MessageCategories.TREE,
+            )
+            if kind == _CHILD_VERTICAL_QUAD:
+                self.vert_info.quads += 1
+                # TODO: must ensure that both quads are identical,
+                # but rotated at 90 degrees or only pick the first one you see
+                self.vert_quad = child
+            elif kind == _CHILD_HORIZONTAL_QUAD:
+                self.horz_quad = child
+            elif kind == _CHILD_OTHER_QUAD:
+                pass
+            elif kind == _CHILD_COMPLEX:
                 self.complex_objects.append(child)
-            else:
-                print("idk what child is", child.name)
 
         if not self.vert_quad:
             logger.error(
@@ -207,61 +138,57 @@ class ForestTree:
             try:
                 _2D_shader = self.vert_quad.material_slots[0].material
             except (IndexError, AttributeError):
-                logger.error(
-                    MessageCodes.E002,
-                    "Tree vert_quad had no 1st slot or no material in its first slot",
-                    self.vert_quad,
-                )
-                raise ValueError(logger.errors[-1].msg_content)
+                msg = "Tree vert_quad had no 1st slot or no material in its first slot"
+                logger.error(MessageCodes.E002, msg, self.vert_quad)
+                raise ValueError(msg)
             else:
-                try:
-                    xplane_tex_path = _2D_shader.xplane_for.texture_path
-                    self.texture_image = next(
-                        image
-                        for image in bpy.data.images
-                        if bpy.path.abspath(image.filepath)
-                        == bpy.path.abspath(xplane_tex_path)
-                    )
-                except StopIteration:
-                    self.texture_image = bpy.data.images.new(
-                        pathlib.Path(bpy.path.abspath(xplane_tex_path)).stem,
-                        width=0,
-                        height=0,
-                    )
-                    self.texture_image.source = "FILE"
-                    self.texture_image.filepath = xplane_tex_path
-
-                if self.texture_image.size[:] == (0, 0):
-                    logger.error(
-                        MessageCodes.E012,
-                        f"Image at '{xplane_tex_path}' could not be found",
-                        self.vert_quad,
-                    )
-                    bpy.data.images.remove(self.texture_image)
-                    self.texture_image = None
-                    raise ValueError(logger.errors[-1].msg_content)
+                xplane_tex_path = export_context.get_material_settings(
+                    _2D_shader
+                ).texture_path
+                self.texture_size = export_context.get_texture_size(
+                    xplane_tex_path, self.vert_quad
+                )
+                if not self.texture_size:
+                    raise ValueError(f"Image at '{xplane_tex_path}' could not be found")
                 else:
-                    size_x, size_y = self.texture_image.size
+                    size_x, size_y = self.texture_size
+
+        def get_uv_rect(quad: bpy.types.Object) -> Tuple[int, int, int, int]:
+            """
+            The s, t, w, h in pixels of a quad's UVs,
+            shared by every quad using the same mesh and texture size
+            """
+            key = (quad.data.name, size_x, size_y)
+            try:
+                return export_context.uv_rects[key]
+            except KeyError:
+                pass
 
-        def set_vert_props():
-            object_eval = self.vert_quad.evaluated_get(depsgraph)
             uvs = [
                 uv_loop.uv
                 for uv_loop in sorted(
-                    (uv_loop for uv_loop in self.vert_quad.data.uv_layers.active.data),
+                    (uv_loop for uv_loop in quad.data.uv_layers.active.data),
                     key=lambda uv_loop: uv_loop.uv,
                 )
             ]
             # TODO: Handle multiple faces at once
             bl, br, tl, tr = uvs[:4]
-            self.vert_info.s, self.vert_info.t = (
-                round(bl.x * size_x),
-                round(bl.y * size_y),
-            )
-            self.vert_info.w, self.vert_info.h = (
-                round(tr.x * size_x) - self.vert_info.s,
-                round(tr.y * size_y) - self.vert_info.t,
+            s, t = round(bl.x * size_x), round(bl.y * size_y)
+            uv_rect = export_context.uv_rects[key] = (
+                s,
+                t,
+                round(tr.x * size_x) - s,
+                round(tr.y * size_y) - t,
             )
+            return uv_rect
+
+        def set_vert_props():
+            (
+                self.vert_info.s,
+                self.vert_info.t,
+                self.vert_info.w,
+                self.vert_info.h,
+            ) = get_uv_rect(self.vert_quad)
 
             left_m, bottom_m, right_m, top_m = [
                 verts_from_edge_global(
@@ -279,33 +206,19 @@ class ForestTree:
             )
 
             self.vert_info.min_height = (left_m[0] - left_m[1]).length
-            self.vert_info.max_height = tree_container.xplane_for.tree.max_height
+            self.vert_info.max_height = self.tree_settings.max_height
             self.vert_info.layer_number = layer_number
             self.vert_info.notes = tree_container.name
-            object_eval.to_mesh_clear()
 
         set_vert_props()
 
         def set_horz_props():
-            object_eval = self.horz_quad.evaluated_get(depsgraph)
-
-            uvs = [
-                uv_loop.uv
-                for uv_loop in sorted(
-                    (uv_loop for uv_loop in self.horz_quad.data.uv_layers.active.data),
-                    key=lambda uv_loop: uv_loop.uv,
-                )
-            ]
-
-            bl_uv, br_uv, tl_uv, tr_uv = sorted(uvs[:4])
-            self.horz_info.s, self.horz_info.t = (
-                round(bl_uv.x * size_x),
-                round(bl_uv.y * size_y),
-            )
-            self.horz_info.w, self.horz_info.h = (
-                round(tr_uv.x * size_x) - self.horz_info.s,
-                round(tr_uv.y * size_y) - self.horz_info.t,
-            )
+            (
+                self.horz_info.s,
+                self.horz_info.t,
+                self.horz_info.w,
+                self.horz_info.h,
+            ) = get_uv_rect(self.horz_quad)
 
             horz_left_m, horz_bottom_m, horz_right_m, horz_top_m = [
                 verts_from_edge_global(
@@ -352,7 +265,6 @@ class ForestTree:
             self.horz_info.psi_rotation = round(
                 math.degrees(self.horz_quad.rotation_euler.z)
             )
-            object_eval.to_mesh_clear()
 
         if self.horz_quad:
             set_horz_props()
@@ -360,32 +272,92 @@ class ForestTree:
     def collect(self) -> None:
         pass
 
-    def write(self) -> str:
-        o = ""
-        if self.tree_container.xplane_for.tree.use_custom_lod:
-            o += (
-                f"#TREE2\t<s>\t<t>\t<w>\t<h>\t<off>\t<frq>\t<min h>\t<max h>\t<nom h>\t<lod>\t<qds>\t<lay>\t<notes>\n"
-                f"TREE2\t{self.vert_info.s}\t{self.vert_info.t}\t{self.vert_info.w}\t{self.vert_info.h}"
-                f"\t{self.vert_info.offset}\t{self.vert_info.freq}\t{self.vert_info.min_height}\t{self.vert_info.max_height}"
-                f"\t{self.vert_info.min_height}\t{self.tree_container.xplane_for.tree.custom_lod}"
-                f"\t{self.vert_info.quads}\t{self.vert_info.layer_number}\t{self.vert_info.notes}\n"
-            )
-        else:
-            o += (
-                f"#TREE\t<s>\t<t>\t<w>\t<h>\t<off>\t<frq>\t<min h>\t<max h>\t<qds>\t<lay>\t<notes>\n"
-                f"TREE\t{self.vert_info}\n"
-            )
-        if self.horz_quad:
-            o += (
-                f"#Y_QUAD\t<left>	<bottom>	<width>	<height>	<offset_center_x>	<offset_center_y>	<width>	<elevation>	<rotation>\n"
-                f"Y_QUAD\t{self.horz_info}"
-            )
-        o += "\n".join(
-            f"MESH_3D\t{mesh_name}"
-            for mesh_name in sorted(
-                {obj.data.name for obj in self.complex_objects},
-                key=lambda mesh_name: mesh_name,
-            )
+    def to_ir(self) -> forest_ir.TreeIR:
+        return forest_ir.TreeIR(
+            vert_info=self.vert_info,
+            horz_info=self.horz_info if self.horz_quad else None,
+            use_custom_lod=self.tree_settings.use_custom_lod,
+            custom_lod=self.tree_settings.custom_lod,
+            tree_group=self.tree_group,
+            mesh_names=sorted({obj.data.name for obj in self.complex_objects}),
         )
 
-        return o
+
+def _get_linked_duplicate_key(obj: bpy.types.Object) -> Optional[Hashable]:
+    """
+    What obj's shape in the world depends on, the same for linked duplicates
+    that only differ by a rotation or a move. None if obj has modifiers,
+    so its evaluated mesh is its own
+    """
+    if obj.type != "MESH" or obj.modifiers:
+        return None
+    matrix = numpy.array(obj.matrix_world, dtype=numpy.float64)
+    # Lengths and angles in world space only depend on matrix.T @ matrix,
+    # which rotating or moving obj doesn't change
+    return (
+        obj.data.name,
+        tuple(numpy.round(matrix[:3, :3].T @ matrix[:3, :3], 6).ravel()),
+    )
+
+
+def _round(values: numpy.ndarray, ndigits: int = 5) -> numpy.ndarray:
+    """Rounds float32 values like round does the Python floats they'd become"""
+    return numpy.round(values.astype(numpy.float64), ndigits)
+
+
+def _is_rectangle(coordinates: numpy.ndarray, edge_vertices: numpy.ndarray) -> bool:
+    """
+    True if the 4 vertices and 4 edges are a rectangle,
+    with right angles at each vertex and opposite edges of the same length
+    """
+    # Each vertex must join exactly 2 edges
+    if numpy.any(numpy.bincount(edge_vertices.ravel(), minlength=4) != 2):
+        return False
+
+    # Each vertex's 2 neighbours, from each edge in both directions
+    both_ways = numpy.concatenate((edge_vertices, edge_vertices[:, ::-1]))
+    both_ways = both_ways[numpy.argsort(both_ways[:, 0], kind="stable")]
+    neighbours = both_ways[:, 1].reshape(-1, 2)
+
+    coordinates = coordinates.astype(numpy.float64)
+    to_first = coordinates[neighbours[:, 0]] - coordinates
+    to_second = coordinates[neighbours[:, 1]] - coordinates
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        cosines = numpy.einsum("ij,ij->i", to_first, to_second) / (
+            numpy.linalg.norm(to_first, axis=1) * numpy.linalg.norm(to_second, axis=1)
+        )
+    # What BMVert.calc_edge_angle gives, pi minus the angle between the edges
+    edge_angles = numpy.pi - numpy.arccos(numpy.clip(cosines, -1, 1))
+    if not numpy.all(_round(edge_angles) == round(math.radians(90), 5)):
+        return False
+
+    edge_lengths = _round(
+        numpy.linalg.norm(
+            coordinates[edge_vertices[:, 0]] - coordinates[edge_vertices[:, 1]], axis=1
+        )
+    )
+    return bool(
+        edge_lengths[0] == edge_lengths[2] and edge_lengths[1] == edge_lengths[3]
+    )
+
+
+def _is_vertical(world_coordinates: numpy.ndarray) -> bool:
+    """
+    True if the rectangle stands on the ground (world Z 0)
+    with its left and right edges straight up
+    """
+    # Like forest_helpers.round_vec, then sorted by x, y, z
+    rounded = _round(world_coordinates).astype(numpy.float32)
+    bl, tl, br, tr = rounded[numpy.lexsort(rounded.T[::-1])]
+    z = _round(numpy.array((bl[2], br[2], tl[2], tr[2])))
+    return bool(
+        numpy.all(z[:2] == 0)
+        and numpy.all(z[2:] > 0)
+        and tl[0] == bl[0]
+        and tr[0] == br[0]
+    )
+
+
+def _is_horizontal(coordinates: numpy.ndarray) -> bool:
+    """True if every vertex has the same (object space) Z"""
+    return len(numpy.unique(_round(coordinates[:, 2]))) == 1
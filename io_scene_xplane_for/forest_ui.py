@@ -118,11 +118,9 @@ class SCENE_PT_io_scene_xplane_for(bpy.types.Panel):
         row.operator("export.xplane_for")
         box = self.layout.box()
         box.label(text="Root Forests")
-        for exportable_forest in [
-            col
-            for col in scene.collection.children
-            if forest_helpers.is_visible_in_viewport(col, bpy.context.view_layer)
-        ]:
+        for exportable_forest in forest_helpers.get_exportable_roots_in_scene(
+            scene, bpy.context.view_layer
+        ):
             self._draw_collection(context, box.box(), exportable_forest)
 
     def _draw_collection(self, context, layout, collection):
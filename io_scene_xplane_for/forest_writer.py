@@ -0,0 +1,537 @@
+"""
+Writes a forest_ir.ForestIR as the text of a .for file, streamed into a
+file handle or any other io.TextIOBase instead of built as one str first.
+
+Like forest_ir, nothing here may use bpy
+"""
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import time
+from typing import (
+    IO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy
+
+from io_scene_xplane_for import forest_constants, forest_ir
+from io_scene_xplane_for.forest_constants import PRECISION_OBJ_FLOAT
+
+
+def floatToStr(n: float) -> str:
+    """
+    Makes a rounded float with as 0's
+    and decimal place removed if possible
+    """
+    # THIS IS A HOT PATH, DO NOT CHANGE WITHOUT PROFILING
+
+    # 'g' can do the rstrip and '.' removal for us, except for rare cases when we need to fallback
+    # to the less fast 'f', rstrip, ternary approach
+    s = f"{n:.{PRECISION_OBJ_FLOAT}g}"
+    if "e" in s:
+        s = f"{n:.{PRECISION_OBJ_FLOAT}f}".rstrip("0")
+        return s if s[-1] != "." else s[:-1]
+    return s
+
+
+def floats_to_strs(values: numpy.ndarray) -> numpy.ndarray:
+    """
+    floatToStr of every float32 in values, as an object array of the same shape.
+
+    Each distinct value (by bit pattern, so -0.0 stays "-0") is only
+    formatted once, tables repeat 0, 1 and their normals a lot
+    """
+    values = numpy.ascontiguousarray(values, dtype=numpy.float32)
+    unique_bits, inverse = numpy.unique(
+        values.view(numpy.uint32), return_inverse=True
+    )
+    unique_strs = numpy.array(
+        [floatToStr(n) for n in unique_bits.view(numpy.float32).tolist()],
+        dtype=object,
+    )
+    return unique_strs[inverse].reshape(values.shape)
+
+
+class ForestWriter:
+    """
+    Collects the pieces of a .for file and writes them to sink in large chunks,
+    once buffer_size characters have been collected and when flushed.
+
+    If hashed, a sha256 of all text written is kept, see digest
+    """
+
+    def __init__(
+        self, sink: IO[str], buffer_size: int = 256 * 1024, hashed: bool = False
+    ):
+        self.sink = sink
+        self.buffer_size = buffer_size
+        self._parts: List[str] = []
+        self._buffered = 0
+        self._hash = hashlib.sha256() if hashed else None
+
+    def __enter__(self) -> "ForestWriter":
+        return self
+
+    def __exit__(self, exc_type, value, traceback) -> None:
+        self.flush()
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def write_lines(self, lines: Iterable[str]) -> None:
+        """Writes each line followed by a new line"""
+        for line in lines:
+            self.write(line + "\n")
+
+    def flush(self) -> None:
+        if not self._parts:
+            return
+        chunk = "".join(self._parts)
+        self._parts.clear()
+        self._buffered = 0
+        if self._hash is not None:
+            self._hash.update(chunk.encode())
+        self.sink.write(chunk)
+
+    def digest(self) -> Optional[bytes]:
+        """
+        The sha256 of everything flushed so far,
+        or None if this writer isn't hashed
+        """
+        return self._hash.digest() if self._hash is not None else None
+
+
+def write_to_str(write: Callable[[ForestWriter], None]) -> str:
+    """Calls write with a ForestWriter and returns all it wrote as a str"""
+    buffer = io.StringIO()
+    with ForestWriter(buffer) as writer:
+        write(writer)
+    return buffer.getvalue()
+
+
+def hash_text_file(path: str) -> Optional[bytes]:
+    """
+    Returns the sha256 of a text file's content, read in chunks,
+    or None if it can't be read. Matches ForestWriter.digest
+    """
+    content_hash = hashlib.sha256()
+    try:
+        with open(path, "r") as text_file:
+            for chunk in iter(lambda: text_file.read(1024 * 1024), ""):
+                content_hash.update(chunk.encode())
+    except (OSError, UnicodeDecodeError):
+        return None
+    return content_hash.digest()
+
+
+def write_forest_file(
+    forest: "forest_ir.ForestIR", path: str, incremental: bool = False
+) -> bool:
+    """
+    Writes forest to the .for file at path, making its folder if needed.
+    Returns False if incremental and the file already had this content,
+    in which case it is left untouched. Raises OSError
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Streamed next to path then moved over it,
+    # so a failed export never leaves half a .for file behind
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f, ForestWriter(f, hashed=incremental) as writer:
+            write_forest(writer, forest)
+        if incremental and writer.digest() == hash_text_file(path):
+            return False
+        os.replace(tmp_path, path)
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def count_written(results: Iterable[Union[bool, OSError]]) -> Tuple[int, int]:
+    """
+    From what write_forest_file returned for each file, how many were written
+    and how many were skipped as unchanged. OSErrors aren't counted
+    """
+    written_count, skipped_count = 0, 0
+    for result in results:
+        if isinstance(result, OSError):
+            continue
+        elif result:
+            written_count += 1
+        else:
+            skipped_count += 1
+    return written_count, skipped_count
+
+
+# What each worker process of write_forest_files_in_pool runs. Unlike
+# multiprocessing's spawn, this never imports the parent's __main__, which under
+# blender -b --python script.py is a script that imports bpy
+_WORKER_COMMAND = (
+    "from io_scene_xplane_for import forest_writer; forest_writer.run_worker()"
+)
+
+
+def write_forest_files_in_pool(
+    jobs: Sequence[Tuple["forest_ir.ForestIR", str]],
+    incremental: bool = False,
+    max_workers: Optional[int] = None,
+    executable: Optional[str] = None,
+) -> Iterator[Tuple[int, Union[bool, OSError], float, float]]:
+    """
+    Calls write_forest_file for each (forest, path) of jobs in a pool of
+    max_workers (default os.cpu_count()) worker processes, started with
+    the Python at executable (default sys.executable). Each job is sent
+    to a free worker pickled, see run_worker.
+
+    Yields, as each job finishes, its index in jobs, what write_forest_file
+    returned or the OSError it raised, and the wall and CPU seconds it took.
+    Raises concurrent.futures.BrokenExecutor (or OSError) if a worker fails,
+    some files may then already be written
+    """
+    worker_count = min(max_workers or os.cpu_count() or 1, len(jobs))
+    env = dict(os.environ)
+    # So workers import this io_scene_xplane_for, wherever the addon is installed
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(
+            None,
+            (
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                env.get("PYTHONPATH"),
+            ),
+        )
+    )
+    workers: List[subprocess.Popen] = []
+    idle_workers: "queue.Queue[subprocess.Popen]" = queue.Queue()
+
+    def write_in_worker(index: int) -> Tuple[int, Union[bool, OSError], float, float]:
+        worker = idle_workers.get()
+        try:
+            forest, path = jobs[index]
+            pickle.dump(
+                (forest, path, incremental), worker.stdin, pickle.HIGHEST_PROTOCOL
+            )
+            worker.stdin.flush()
+            result, wall, cpu = pickle.load(worker.stdout)
+        except (EOFError, OSError, pickle.PickleError) as e:
+            raise concurrent.futures.BrokenExecutor(
+                f"A .for writer process stopped (exit code {worker.poll()})"
+            ) from e
+        finally:
+            idle_workers.put(worker)
+        return index, result, wall, cpu
+
+    try:
+        for _ in range(worker_count):
+            worker = subprocess.Popen(
+                [executable or sys.executable, "-c", _WORKER_COMMAND],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                env=env,
+            )
+            workers.append(worker)
+            idle_workers.put(worker)
+
+        threads = concurrent.futures.ThreadPoolExecutor(max_workers=worker_count)
+        futures = [threads.submit(write_in_worker, i) for i in range(len(jobs))]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            threads.shutdown()
+    finally:
+        for worker in workers:
+            # At the end of its input a worker exits
+            with contextlib.suppress(OSError):
+                worker.stdin.close()
+            worker.wait()
+            worker.stdout.close()
+
+
+def run_worker() -> None:
+    """
+    The loop of a write_forest_files_in_pool worker process: reads pickled
+    (forest, path, incremental) jobs from stdin until it's closed, writing
+    each with write_forest_file, and answers each with the pickled
+    (result or OSError, wall seconds, CPU seconds) on stdout
+    """
+    jobs_in, results_out = sys.stdin.buffer, sys.stdout.buffer
+    # Nothing printed may end up between the results
+    sys.stdout = sys.stderr
+    while True:
+        try:
+            forest, path, incremental = pickle.load(jobs_in)
+        except EOFError:
+            return
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            result: Union[bool, OSError] = write_forest_file(forest, path, incremental)
+        except OSError as e:
+            result = e
+        pickle.dump(
+            (
+                result,
+                time.perf_counter() - start_wall,
+                time.process_time() - start_cpu,
+            ),
+            results_out,
+            pickle.HIGHEST_PROTOCOL,
+        )
+        results_out.flush()
+
+
+def write_forest(writer: ForestWriter, forest: "forest_ir.ForestIR") -> None:
+    write_header(writer, forest.header)
+    writer.write("\n")
+    for mesh in forest.meshes:
+        write_mesh(writer, mesh)
+
+    writer.write("\n")
+
+    for lay in sorted(forest.trees_by_layer):
+        if forest.header.perlin_choice:
+            for grp in range(4):
+                trees_in_group = forest.trees_by_layer_and_group.get((lay, grp), [])
+                if len(trees_in_group) > 0:
+                    wght = forest.groups_weight[grp]
+                    writer.write(f"GROUP {lay} {wght}")
+                    for tr in trees_in_group:
+                        writer.write("\n")
+                        writer.write(
+                            "\n".join(
+                                "\t" + line
+                                for line in f"{write_tree(tr)}\n".splitlines()
+                            )
+                        )
+                    writer.write("\n")
+        else:
+            for tr in forest.trees_by_layer[lay]:
+                writer.write(f"{write_tree(tr)}\n")
+    writer.write("\n")
+
+    for surface_type in forest.skip_surfaces:
+        writer.write(f"\nSKIP_SURFACE {surface_type}")
+
+
+def write_header(writer: ForestWriter, header: "forest_ir.HeaderIR") -> None:
+    writer.write("\n".join(("A", "800", "FOREST",)) + "\n")
+
+    writer.write("\n")
+    writer.write(
+        write_shader("SHADER_2D", header.shader_2D, header.has_seasons) + "\n"
+    )
+
+    if header.shader_3D:
+        writer.write("\n")
+        writer.write(
+            write_shader("SHADER_3D", header.shader_3D, header.has_seasons) + "\n"
+        )
+
+    writer.write("\n")
+    writer.write(
+        "\n".join(
+            directive
+            for directive in (
+                f"LOD\t{floatToStr(header.max_lod)}" if header.has_max_lod else f"",
+                f"SCALE_X\t{header.scale_x}",
+                f"SCALE_Y\t{header.scale_y}",
+                f"SPACING\t{' '.join(map(floatToStr, header.spacing))}",
+                f"RANDOM\t{' '.join(map(floatToStr, header.randomness))}",
+                "" if header.cast_shadow else "NO_SHADOW",
+            )
+            if directive
+        )
+        + "\n"
+    )
+    writer.write(write_perlin_params(header))
+
+
+def write_perlin_params(header: "forest_ir.HeaderIR") -> str:
+    def fmt_perlin_params(directive: str, perlin_params):
+        try:
+            s = f"{directive} " + (
+                "\t".join(
+                    " ".join(map(floatToStr, param_pair))
+                    for param_pair in zip(perlin_params[:-1:2], perlin_params[1::2])
+                )
+            )
+            return s
+        except (AttributeError, TypeError) as e:
+            return ""
+
+    return "\n".join(
+        directive
+        for directive in (
+            fmt_perlin_params("DENSITY_PARAMS", header.perlin_density),
+            fmt_perlin_params("CHOICE_PARAMS", header.perlin_choice),
+            fmt_perlin_params("HEIGHT_PARAMS", header.perlin_height),
+        )
+        if directive
+    )
+
+
+def write_shader(
+    shader_type: str, shader: "forest_ir.ShaderIR", has_seasons: bool
+) -> str:
+    """Where shader_type is 'SHADER_2D' or 'SHADER_3D'"""
+    # TODO: pathlib this!
+    texture_path = shader.texture_path.replace("//", "").replace("\\", "/")
+    texture_path_normal = shader.texture_path_normal.replace("//", "").replace(
+        "\\", "/"
+    )
+    texture_path_weather = shader.texture_path_weather.replace("//", "").replace(
+        "\\", "/"
+    )
+    # get luma values
+    luma = ""
+    for i in range(0, 4):
+        luma += str(round(shader.luma_values[i], 4)) + " "
+    o = "\n".join(
+        "\t" + directive if directive != shader_type else shader_type
+        for directive in (
+            shader_type,
+            f"TEXTURE {texture_path}",
+            f"SEASONAL {texture_path}" if has_seasons else "",
+            f"TEXTURE_NORMAL {floatToStr(shader.texture_path_normal_ratio)}\t{texture_path_normal}"
+            if shader.texture_path_normal
+            else "",
+            f"WEATHER {texture_path_weather}"
+            if shader.texture_path_weather and not shader.has_luma_values
+            else "",
+            f"SNOW_ALBEDO_LUMA {luma}" if shader.has_luma_values else "",
+            f"NO_BLEND {floatToStr(shader.no_blend_level)}"
+            if shader.blend_mode == forest_constants.BLEND_NO_BLEND
+            else "",
+            f"BLEND_HASH {floatToStr(shader.blend_hash_level)}"
+            if shader.blend_mode == forest_constants.BLEND_BLEND_HASH
+            else "",
+            f"SPECULAR {floatToStr(shader.specular)}" if shader.has_specular else "",
+            f"BUMP_LEVEL {floatToStr(shader.bump_level)}"
+            if shader.has_bump_level
+            else "",
+            "NO_SHADOW" if shader.no_shadow else "",
+            "SHADOW_BLEND" if shader.shadow_blend else "",
+            f"{shader.normal_mode}"
+            if shader.normal_mode != forest_constants.NORMAL_MODE_NONE
+            else "",
+        )
+        if directive
+    )
+    return o
+
+
+def write_tree(tree: "forest_ir.TreeIR") -> str:
+    vert_info = tree.vert_info
+    o = []
+    if tree.use_custom_lod:
+        o.append(
+            f"#TREE2\t<s>\t<t>\t<w>\t<h>\t<off>\t<frq>\t<min h>\t<max h>\t<nom h>\t<lod>\t<qds>\t<lay>\t<notes>\n"
+            f"TREE2\t{vert_info.s}\t{vert_info.t}\t{vert_info.w}\t{vert_info.h}"
+            f"\t{vert_info.offset}\t{vert_info.freq}\t{vert_info.min_height}\t{vert_info.max_height}"
+            f"\t{vert_info.min_height}\t{tree.custom_lod}"
+            f"\t{vert_info.quads}\t{vert_info.layer_number}\t{vert_info.notes}\n"
+        )
+    else:
+        o.append(
+            f"#TREE\t<s>\t<t>\t<w>\t<h>\t<off>\t<frq>\t<min h>\t<max h>\t<qds>\t<lay>\t<notes>\n"
+            f"TREE\t{vert_info}\n"
+        )
+    if tree.horz_info:
+        o.append(
+            f"#Y_QUAD\t<left>	<bottom>	<width>	<height>	<offset_center_x>	<offset_center_y>	<width>	<elevation>	<rotation>\n"
+            f"Y_QUAD\t{tree.horz_info}"
+        )
+    o.append("\n".join(f"MESH_3D\t{mesh_name}" for mesh_name in tree.mesh_names))
+
+    return "".join(o)
+
+
+# A VERTEX line from a row of MeshIR.vertices, each float already floatToStr'd
+_VERTEX_FORMAT = "VERTEX\t%s %s %s\t%s %s %s\t%s\t%s\t%s\t%s\t%s"
+# VERTEX rows (and ten times as many indices) formatted at once by _write_mesh_table
+_TABLE_CHUNK_ROWS = 4096
+
+
+def write_mesh(writer: ForestWriter, mesh: "forest_ir.MeshIR") -> None:
+    """
+    Writes the MESH.... VERTEX.... IDX.... table of a mesh.
+    A shared mesh is only formatted once
+    """
+    if mesh.table is not None:
+        writer.write(mesh.table)
+    elif mesh.shared:
+        mesh.table = write_to_str(lambda w: _write_mesh_table(w, mesh))
+        if mesh.on_table:
+            mesh.on_table(mesh)
+        writer.write(mesh.table)
+    else:
+        _write_mesh_table(writer, mesh)
+
+
+def _write_mesh_table(writer: ForestWriter, mesh: "forest_ir.MeshIR") -> None:
+    writer.write("\n")
+    if mesh.no_shadow: sh = "NO_SHADOW"
+    else: sh = ""
+    writer.write(
+        "\t".join(
+            (
+                f"MESH",
+                f"{mesh.name}",
+                f"{mesh.lod_near}",
+                f"{mesh.lod_far}",
+                f"{len(mesh.vertices)}",
+                f"{len(mesh.indices)}",
+                f"{mesh.wind_bend_ratio}",
+                f"{mesh.branch_stiffness}",
+                f"{mesh.wind_speed}",
+                f"{sh}",
+            )
+        )
+        + "\n"
+    )
+    # An empty table still gets its (empty) line
+    if not len(mesh.vertices):
+        writer.write("\n")
+    # Formatted from the arrays a chunk at a time, so only one chunk
+    # of them is ever held as Python floats and ints
+    for start in range(0, len(mesh.vertices), _TABLE_CHUNK_ROWS):
+        writer.write_lines(
+            map(
+                _VERTEX_FORMAT.__mod__,
+                map(
+                    tuple,
+                    floats_to_strs(
+                        mesh.vertices[start : start + _TABLE_CHUNK_ROWS]
+                    ).tolist(),
+                ),
+            )
+        )
+    if not len(mesh.indices):
+        writer.write("\n")
+    # Thanks Steg! So concise:
+    # https://stackoverflow.com/questions/1624883/alternative-way-to-split-a-list-into-groups-of-n/1624988#1624988
+    for start in range(0, len(mesh.indices), _TABLE_CHUNK_ROWS * 10):
+        indices = mesh.indices[start : start + _TABLE_CHUNK_ROWS * 10].tolist()
+        writer.write_lines(
+            ("IDX\t" + "\t".join(map(str, indices[i : i + 10])))
+            for i in range(0, len(indices), 10)
+        )
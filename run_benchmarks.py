@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+# Like run_tests.py, this runs both as a script and inside blender -b,
+# where the repository isn't on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import benchmarks
+
+BENCHMARK_RESULTS_REGEX = re.compile(r"^BENCHMARK RESULTS: (?P<json>.*)$", re.MULTILINE)
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmarks", "baseline.json"
+)
+
+
+def _make_argparse():
+    parser = argparse.ArgumentParser(
+        description="Runs the XPlaneForExporter microbenchmarks"
+    )
+    selection = parser.add_argument_group("Benchmark Selection")
+    selection.add_argument(
+        "-f", "--filter", help="Filter benchmarks with a regular expression", type=str
+    )
+    selection.add_argument(
+        "--exclude", help="Exclude benchmarks with a regular expression", type=str
+    )
+    selection.add_argument(
+        "-r",
+        "--repeat",
+        help="Timing runs per benchmark, the best is kept",
+        default=10,
+        type=int,
+    )
+
+    baseline = parser.add_argument_group("Baseline")
+    baseline.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE,
+        help="JSON file of results to compare against",
+        type=str,
+    )
+    baseline.add_argument(
+        "--save-baseline",
+        default=False,
+        help="Save these results (merged with any others) as the new baseline",
+        action="store_true",
+    )
+    baseline.add_argument(
+        "--tolerance",
+        # Reruns on the same machine vary by up to about 25%
+        default=0.3,
+        help="How much slower than the baseline, as a fraction, is a regression",
+        type=float,
+    )
+
+    blender_options = parser.add_argument_group("Blender Options")
+    blender_options.add_argument(
+        "--blender",
+        default="blender",  # Use the blender in the system path
+        type=str,
+        help="Provide alternative path to Blender executable",
+    )
+    # Used when this script runs itself in Blender
+    blender_options.add_argument(
+        "--inside-blender", default=False, action="store_true", help=argparse.SUPPRESS
+    )
+    return parser
+
+
+def _select(argv, needs_blender: bool):
+    return [
+        bench
+        for name, bench in sorted(benchmarks.BENCHMARKS.items())
+        if bench.needs_blender == needs_blender
+        and (not argv.filter or re.search(argv.filter, name))
+        and not (argv.exclude and re.search(argv.exclude, name))
+    ]
+
+
+def _run_in_blender(argv, script_args):
+    """
+    Runs the benchmarks that need Blender in blender -b,
+    returns their results or None if Blender couldn't be found
+    """
+    if not shutil.which(argv.blender):
+        return None
+    blender_args = [
+        argv.blender,
+        "--factory-startup",
+        "-noaudio",
+        "-b",
+        "--python",
+        os.path.abspath(__file__),
+        "--",
+        *script_args,
+        "--inside-blender",
+    ]
+    out = subprocess.check_output(
+        blender_args, stderr=subprocess.STDOUT, universal_newlines=True
+    )
+    match = BENCHMARK_RESULTS_REGEX.search(out)
+    if not match:
+        print(out)
+        raise Exception("Blender didn't print its benchmark results")
+    return json.loads(match.group("json"))
+
+
+def main(script_args) -> int:
+    """
+    Return is exit code, 0 for good, 1 if anything regressed past the tolerance
+    """
+    argv = _make_argparse().parse_args(script_args)
+    benchmarks.load_all()
+
+    if argv.inside_blender:
+        results = [
+            benchmarks.run_benchmark(bench, argv.repeat)
+            for bench in _select(argv, needs_blender=True)
+        ]
+        print("BENCHMARK RESULTS: " + json.dumps(benchmarks.to_json_dict(results)))
+        return 0
+
+    results = benchmarks.to_json_dict(
+        [
+            benchmarks.run_benchmark(bench, argv.repeat)
+            for bench in _select(argv, needs_blender=False)
+        ]
+    )
+    blender_benches = _select(argv, needs_blender=True)
+    if blender_benches:
+        blender_results = _run_in_blender(argv, script_args)
+        if blender_results is None:
+            print(
+                f"Skipping {len(blender_benches)} benchmarks that need Blender,"
+                f" '{argv.blender}' wasn't found"
+            )
+        else:
+            results.update(blender_results)
+
+    try:
+        with open(argv.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        baseline = {}
+
+    exit_code = 0
+    for name, values in results.items():
+        result = benchmarks.BenchmarkResult(name, **values)
+        comparison = benchmarks.compare(result, baseline.get(name), argv.tolerance)
+        print(f"{result} {comparison}".rstrip())
+        if "REGRESSION" in comparison:
+            exit_code = 1
+
+    if argv.save_baseline:
+        baseline.update(results)
+        with open(argv.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f"Saved baseline to {argv.baseline}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    # In Blender, our arguments come after "--"
+    args = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else sys.argv[1:]
+    exit_code = main(args)
+    if "--inside-blender" not in args:
+        sys.exit(exit_code)
@@ -10,7 +10,12 @@ from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 import bpy
 
 import io_scene_xplane_for
-from io_scene_xplane_for import forest_file, forest_helpers, forest_logger
+from io_scene_xplane_for import (
+    forest_context,
+    forest_file,
+    forest_helpers,
+    forest_logger,
+)
 from io_scene_xplane_for.forest_logger import ForestLogger, logger
 
 from . import test_creation_helpers
@@ -46,20 +51,17 @@ class TemporarilyMakeRootExportable:
         else:
             self.potential_root = potential_root
 
-        all_layer_collections = {
-            lc.name: lc
-            for lc in io_scene_xplane_for.forest_helpers.get_layer_collections_in_view_layer(
-                self.view_layer
-            )
-        }
-        self.original_hide_viewport = all_layer_collections[
-            self.potential_root.name
-        ].hide_viewport
+        self.visibility_index = forest_helpers.VisibilityIndex(self.view_layer)
+        self.original_hide_viewport = self.visibility_index.get_layer_collection(
+            self.potential_root
+        ).hide_viewport
 
         self.original_disable_viewport = self.potential_root.hide_viewport
 
     def __enter__(self):
-        test_creation_helpers.make_root_exportable(self.potential_root, self.view_layer)
+        test_creation_helpers.make_root_exportable(
+            self.potential_root, self.view_layer, self.visibility_index
+        )
 
     def __exit__(self, exc_type, value, traceback):
         test_creation_helpers.make_root_unexportable(
@@ -67,6 +69,7 @@ class TemporarilyMakeRootExportable:
             self.view_layer,
             self.original_hide_viewport,
             self.original_disable_viewport,
+            self.visibility_index,
         )
 
 
@@ -337,10 +340,13 @@ class ForestTestCase(unittest.TestCase):
         self,
         potential_root: Union[forest_helpers.PotentialRoot, str],
         view_layer: Optional[bpy.types.ViewLayer] = None,
+        export_context: Optional[forest_context.ExportContext] = None,
     ) -> forest_file.ForestFile:
         """
         A thin wrapper around forest_file.create_forest_single_file where the potential root
         is temporarily is made exportable.
+
+        export_context is passed along to it
         """
         potential_root = (
             test_creation_helpers.lookup_potential_root_from_name(potential_root)
@@ -350,7 +356,9 @@ class ForestTestCase(unittest.TestCase):
 
         view_layer = view_layer or bpy.context.scene.view_layers[0]
         with TemporarilyMakeRootExportable(potential_root, view_layer):
-            xp_file = forest_file.create_forest_single_file(potential_root)
+            xp_file = forest_file.create_forest_single_file(
+                potential_root, export_context
+            )
         return xp_file
 
     def exportExportableRoot(
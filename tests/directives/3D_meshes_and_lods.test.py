@@ -1,6 +1,7 @@
 import inspect
 import os
 import pprint
+import shutil
 import sys
 from typing import Tuple
 
@@ -8,13 +9,19 @@ import bpy
 
 import io_scene_xplane_for
 import tests
+from io_scene_xplane_for import forest_cache, forest_constants, forest_context
 from io_scene_xplane_for.forest_logger import MessageCodes, logger
-from tests import ForestTestCase, runTestCases, make_fixture_path
+from tests import ForestTestCase, get_tmp_folder, runTestCases, make_fixture_path
 
 _dirname = os.path.dirname(__file__)
 
 
 class Test3DMeshesAndLODs(tests.ForestTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(get_tmp_folder(), "mesh_cache")
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
     def test_mesh_lods_used(self) -> None:
         filename = inspect.stack()[0].function
 
@@ -29,5 +36,74 @@ class Test3DMeshesAndLODs(tests.ForestTestCase):
             filename,
         )
 
+    def test_mesh_engines_identical(self) -> None:
+        def write(mesh_engine: str) -> str:
+            with forest_context.ExportContext(mesh_engine) as export_context:
+                return self.createForestFileFromPotentialRoot(
+                    "mesh_lods_used", export_context=export_context
+                ).write()
+
+        self.assertEqual(
+            write(forest_constants.MESH_ENGINE_PYTHON),
+            write(forest_constants.MESH_ENGINE_NUMPY),
+        )
+
+    def test_mesh_table_cache_reused(self) -> None:
+        cache = forest_cache.MeshTableCache()
+
+        with forest_context.ExportContext(mesh_table_cache=cache) as export_context:
+            first = self.createForestFileFromPotentialRoot(
+                "mesh_lods_used", export_context=export_context
+            )
+            self.assertEqual(cache.hits, 0)
+            second = self.createForestFileFromPotentialRoot(
+                "mesh_lods_used", export_context=export_context
+            )
+        self.assertEqual(cache.hits, len(cache))
+        self.assertEqual(second.write(), first.write())
+        # Both forests share each table, formatted once
+        for first_mesh, second_mesh in zip(first.ir.meshes, second.ir.meshes):
+            self.assertIs(first_mesh, second_mesh)
+
+    def test_mesh_table_cache_folder_reused(self) -> None:
+        def write(cache: forest_cache.MeshTableCache) -> str:
+            with forest_context.ExportContext(mesh_table_cache=cache) as export_context:
+                return self.createForestFileFromPotentialRoot(
+                    "mesh_lods_used", export_context=export_context
+                ).write()
+
+        cache = forest_cache.MeshTableCache(cache_dir=self.cache_dir)
+        first = write(cache)
+        self.assertEqual(cache.misses, len(cache))
+        # A fresh cache, like the one of the next Blender session
+        cache = forest_cache.MeshTableCache(cache_dir=self.cache_dir)
+        self.assertEqual(write(cache), first)
+        self.assertEqual(cache.misses, 0)
+        self.assertEqual(cache.disk_hits, len(cache))
+
+    def test_mesh_table_cache_folder_corrupt_entry(self) -> None:
+        def write(cache: forest_cache.MeshTableCache) -> str:
+            with forest_context.ExportContext(mesh_table_cache=cache) as export_context:
+                return self.createForestFileFromPotentialRoot(
+                    "mesh_lods_used", export_context=export_context
+                ).write()
+
+        first = write(forest_cache.MeshTableCache(cache_dir=self.cache_dir))
+        for folder, _, file_names in os.walk(self.cache_dir):
+            for file_name in file_names:
+                path = os.path.join(folder, file_name)
+                with open(path, "r+b") as saved:
+                    saved.truncate(os.path.getsize(path) // 2)
+
+        # Rebuilt, with a warning, and written again
+        logger.reset()
+        cache = forest_cache.MeshTableCache(cache_dir=self.cache_dir)
+        self.assertEqual(write(cache), first)
+        self.assertEqual(cache.misses, len(cache))
+        self.assertEqual({msg.msg_code for msg in logger.warnings}, {MessageCodes.W000})
+        cache = forest_cache.MeshTableCache(cache_dir=self.cache_dir)
+        self.assertEqual(write(cache), first)
+        self.assertEqual(cache.disk_hits, len(cache))
+
 
 runTestCases([Test3DMeshesAndLODs])
@@ -0,0 +1,80 @@
+import os
+import shutil
+
+import bpy
+
+import io_scene_xplane_for
+import tests
+from io_scene_xplane_for import forest_writer
+from tests import ForestTestCase, get_tmp_folder, runTestCases, test_creation_helpers
+
+_dirname = os.path.dirname(__file__)
+
+
+class TestIncrementalExport(tests.ForestTestCase):
+    def setUp(self):
+        super().setUp()
+        self.out_dir = os.path.join(get_tmp_folder(), "incremental_export")
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_second_export_skips_unchanged_files(self) -> None:
+        forests = [
+            test_creation_helpers.create_forest_ir(f"test_incremental_{i}")
+            for i in range(3)
+        ]
+        paths = [
+            os.path.join(self.out_dir, forest.file_name + ".for") for forest in forests
+        ]
+
+        results = [
+            forest_writer.write_forest_file(forest, path, incremental=True)
+            for forest, path in zip(forests, paths)
+        ]
+        self.assertEqual(results, [True, True, True])
+        self.assertEqual(forest_writer.count_written(results), (3, 0))
+
+        # Backdated, so a rewrite can't go unnoticed however coarse the mtimes are
+        for path in paths:
+            os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+        forests[1].header.scale_x = 1024
+
+        results = [
+            forest_writer.write_forest_file(forest, path, incremental=True)
+            for forest, path in zip(forests, paths)
+        ]
+        self.assertEqual(results, [False, True, False])
+        self.assertEqual(forest_writer.count_written(results), (1, 2))
+        self.assertEqual(
+            [os.stat(path).st_mtime_ns == 1_000_000_000 for path in paths],
+            [True, False, True],
+        )
+        with open(paths[1]) as f:
+            self.assertIn("SCALE_X\t1024", f.read())
+        # Every .tmp file was moved into place or removed
+        self.assertEqual(
+            sorted(os.listdir(self.out_dir)), sorted(map(os.path.basename, paths))
+        )
+
+    def test_failed_write_keeps_old_file(self) -> None:
+        forest = test_creation_helpers.create_forest_ir("test_incremental_failed")
+        path = os.path.join(self.out_dir, forest.file_name + ".for")
+        self.assertTrue(forest_writer.write_forest_file(forest, path, incremental=True))
+        with open(path) as f:
+            content = f.read()
+
+        # A VERTEX row one value short fails halfway through the MESH table
+        forest.meshes[0].vertices = forest.meshes[0].vertices[:, :10]
+        with self.assertRaises(TypeError):
+            forest_writer.write_forest_file(forest, path, incremental=True)
+        with open(path) as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(os.listdir(self.out_dir), [os.path.basename(path)])
+
+    def test_count_written_ignores_errors(self) -> None:
+        self.assertEqual(
+            forest_writer.count_written([True, OSError("disk full"), False, True]),
+            (2, 1),
+        )
+
+
+runTestCases([TestIncrementalExport])
@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+
+import bpy
+
+import io_scene_xplane_for
+import tests
+from io_scene_xplane_for import forest_writer
+from tests import ForestTestCase, get_tmp_folder, runTestCases, test_creation_helpers
+
+_dirname = os.path.dirname(__file__)
+
+_EXECUTABLE = (
+    sys.executable if bpy.app.version >= (2, 91, 0) else bpy.app.binary_path_python
+)
+
+
+class TestProcessPoolExport(tests.ForestTestCase):
+    def setUp(self):
+        super().setUp()
+        self.out_dir = os.path.join(get_tmp_folder(), "process_pool_export")
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_pool_writes_every_file(self) -> None:
+        # This script is Blender's __main__ and imports bpy, which workers
+        # started like multiprocessing's spawn would import too, and fail
+        jobs = [
+            (
+                test_creation_helpers.create_forest_ir(f"test_pool_{i}"),
+                os.path.join(self.out_dir, f"test_pool_{i}.for"),
+            )
+            for i in range(6)
+        ]
+        finished = sorted(
+            (index, result)
+            for index, result, _, _ in forest_writer.write_forest_files_in_pool(
+                jobs, max_workers=3, executable=_EXECUTABLE
+            )
+        )
+        self.assertEqual(finished, [(index, True) for index in range(len(jobs))])
+
+        for forest, path in jobs:
+            with open(path) as f:
+                self.assertEqual(
+                    f.read(),
+                    forest_writer.write_to_str(
+                        lambda writer: forest_writer.write_forest(writer, forest)
+                    ),
+                )
+
+    def test_pool_returns_os_errors(self) -> None:
+        blocker = os.path.join(self.out_dir, "not_a_folder")
+        os.makedirs(self.out_dir)
+        open(blocker, "w").close()
+        jobs = [
+            (
+                test_creation_helpers.create_forest_ir("test_pool_good"),
+                os.path.join(self.out_dir, "test_pool_good.for"),
+            ),
+            (
+                test_creation_helpers.create_forest_ir("test_pool_bad"),
+                os.path.join(blocker, "test_pool_bad.for"),
+            ),
+        ]
+        results = {
+            index: result
+            for index, result, _, _ in forest_writer.write_forest_files_in_pool(
+                jobs, max_workers=2, executable=_EXECUTABLE
+            )
+        }
+        self.assertIs(results[0], True)
+        self.assertIsInstance(results[1], OSError)
+        self.assertTrue(os.path.exists(jobs[0][1]))
+
+
+runTestCases([TestProcessPoolExport])
@@ -0,0 +1,107 @@
+import errno
+import io
+import json
+import os
+
+import bpy
+
+import io_scene_xplane_for
+import tests
+from io_scene_xplane_for import forest_logger
+from io_scene_xplane_for.forest_logger import ForestLogger, MessageCodes, logger
+from tests import ForestTestCase, get_tmp_folder, runTestCases, test_creation_helpers
+
+_dirname = os.path.dirname(__file__)
+
+
+class _FullDisk(io.StringIO):
+    def write(self, text: str) -> int:
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+
+class TestJSONLinesTransport(tests.ForestTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(get_tmp_folder(), exist_ok=True)
+        self.path = os.path.join(get_tmp_folder(), "json_lines_transport.jsonl")
+
+    def tearDown(self):
+        logger.reset(transports=[ForestLogger.ConsoleTransport()])
+
+    def read_codes(self):
+        with open(self.path) as log_file:
+            return [json.loads(line)["code"] for line in log_file]
+
+    def test_writes_on_flush_and_close(self) -> None:
+        transport = ForestLogger.JSONLinesTransport(self.path)
+        logger.reset(transports=[transport])
+        logger.warn(MessageCodes.W000, "first", None)
+        logger.flush()
+        self.assertEqual(self.read_codes(), ["W000"])
+        logger.error(MessageCodes.E000, "second", None)
+        transport.close()
+        self.assertEqual(self.read_codes(), ["W000", "E000"])
+
+    def test_write_error_does_not_hang_flush(self) -> None:
+        transport = ForestLogger.JSONLinesTransport(self.path)
+        console = ForestLogger.ConsoleTransport()
+        logger.reset(transports=[console, transport])
+        transport._file.close()
+        transport._file = _FullDisk()
+        for i in range(3):
+            logger.warn(MessageCodes.W000, f"message {i}", None)
+
+        # Raised here, on the main thread, and the transport is dropped
+        logger.flush()
+        self.assertEqual(logger.transports, [console])
+        self.assertEqual(
+            [msg.msg_code for msg in logger.warnings],
+            [MessageCodes.W000] * 3 + [MessageCodes.W003],
+        )
+        self.assertIn("No space left on device", logger.warnings[-1].msg_content)
+        # Only raised once
+        transport.close()
+        self.assertFalse(transport._thread.is_alive())
+
+    def test_write_error_raised_once(self) -> None:
+        transport = ForestLogger.JSONLinesTransport(self.path)
+        transport._file.close()
+        transport._file = _FullDisk()
+        transport(ForestLogger.Message(MessageCodes.W000, "message", None, None))
+        with self.assertRaises(OSError):
+            transport.flush()
+        transport(ForestLogger.Message(MessageCodes.W000, "message", None, None))
+        transport.flush()
+        transport.close()
+
+    def test_closed_transport_does_nothing(self) -> None:
+        transport = ForestLogger.JSONLinesTransport(self.path)
+        logger.reset(transports=[transport])
+        logger.warn(MessageCodes.W000, "before closing", None)
+        transport.close()
+        logger.warn(MessageCodes.W000, "after closing", None)
+        transport.flush()
+        transport.close()
+        # Flushes the closed transport
+        logger.reset()
+        self.assertEqual(self.read_codes(), ["W000"])
+
+    def test_export_removes_its_transport(self) -> None:
+        test_creation_helpers.delete_everything()
+        for _ in range(2):
+            self.assertEqual(
+                bpy.ops.export.xplane_for(
+                    filepath=str(get_tmp_folder()), log_file=self.path
+                ),
+                {"CANCELLED"},
+            )
+            self.assertFalse(
+                any(
+                    isinstance(transport, ForestLogger.JSONLinesTransport)
+                    for transport in logger.transports
+                )
+            )
+            self.assertEqual(self.read_codes(), ["E010"])
+
+
+runTestCases([TestJSONLinesTransport])
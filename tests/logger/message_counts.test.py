@@ -0,0 +1,64 @@
+import os
+
+import bpy
+
+import io_scene_xplane_for
+import tests
+from io_scene_xplane_for.forest_logger import (
+    ForestLogger,
+    MessageCodes,
+    MessageTypes,
+    logger,
+)
+from tests import ForestTestCase, runTestCases
+
+_dirname = os.path.dirname(__file__)
+
+
+class TestMessageCounts(tests.ForestTestCase):
+    def setUp(self):
+        super().setUp()
+        logger.reset(transports=[])
+
+    def tearDown(self):
+        logger.reset(transports=[ForestLogger.ConsoleTransport()])
+
+    def test_counts_by_type(self) -> None:
+        self.assertFalse(logger.has_errors)
+        logger.info(MessageCodes.I000, "Not writing 'a.for'", None)
+        logger.warn(MessageCodes.W000, "Cache folder is read only", None)
+        logger.warn(MessageCodes.W002, "Could not write the profile report", None)
+        self.assertFalse(logger.has_errors)
+
+        logger.error(MessageCodes.E004, "tree_0 has no vertical quad", None)
+        logger.error(MessageCodes.E004, "tree_1 has no vertical quad", None)
+        # A repeat isn't counted again
+        logger.error(MessageCodes.E004, "tree_1 has no vertical quad", None)
+        logger.success(MessageCodes.S000, "Export finished without errors", None)
+
+        self.assertTrue(logger.has_errors)
+        self.assertEqual(
+            {msg_type: logger.count(msg_type) for msg_type in MessageTypes},
+            {
+                MessageTypes.DEBUG: 0,
+                MessageTypes.INFO: 1,
+                MessageTypes.WARNING: 2,
+                MessageTypes.ERROR: 2,
+                MessageTypes.SUCCESS: 1,
+            },
+        )
+        self.assertEqual(
+            [msg.msg_code for msg in logger.warnings],
+            [MessageCodes.W000, MessageCodes.W002],
+        )
+        self.assertEqual(len(logger.messages), 6)
+
+    def test_reset_clears_counts(self) -> None:
+        logger.error(MessageCodes.E004, "tree_0 has no vertical quad", None)
+        logger.reset(transports=[])
+        self.assertFalse(logger.has_errors)
+        self.assertEqual(logger.count(MessageTypes.ERROR), 0)
+        self.assertEqual(logger.errors, [])
+
+
+runTestCases([TestMessageCounts])
@@ -0,0 +1,104 @@
+import contextlib
+import io
+import os
+
+import bpy
+
+import io_scene_xplane_for
+import tests
+from io_scene_xplane_for.forest_logger import (
+    ForestLogger,
+    MessageCategories,
+    MessageCodes,
+    MessageTypes,
+    logger,
+)
+from tests import ForestTestCase, runTestCases
+
+_dirname = os.path.dirname(__file__)
+
+
+class _Datablock:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class TestMessageDeduplication(tests.ForestTestCase):
+    def setUp(self):
+        super().setUp()
+        self.console = ForestLogger.ConsoleTransport()
+        logger.reset(transports=[self.console])
+
+    def tearDown(self):
+        logger.max_per_code = 100
+        logger.max_samples = 5
+        logger.reset(transports=[ForestLogger.ConsoleTransport()])
+
+    def test_repeats_are_counted(self) -> None:
+        logger.max_samples = 2
+        trees = [_Datablock(f"tree_{i}") for i in range(4)]
+        for tree in trees:
+            logger.error(MessageCodes.E012, "Texture 'bark.png' is missing", tree)
+        logger.error(MessageCodes.E012, "Texture 'leaves.png' is missing", trees[0])
+
+        self.assertEqual(
+            [(msg.msg_content, msg.count) for msg in logger.errors],
+            [
+                ("Texture 'bark.png' is missing", 4),
+                ("Texture 'leaves.png' is missing", 1),
+            ],
+        )
+        self.assertEqual(logger.errors[0].problem_datablocks, trees[:2])
+        self.assertEqual(
+            str(logger.errors[0]),
+            "E012: Texture 'bark.png' is missing (4 times, e.g. tree_0, tree_1)",
+        )
+
+    def test_console_prints_counts_on_flush(self) -> None:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            for i in range(3):
+                logger.warn(MessageCodes.W000, "Cache folder is read only", None)
+            self.assertEqual(out.getvalue(), "")
+            logger.flush()
+        self.assertEqual(out.getvalue(), "W000: Cache folder is read only (3 times)\n")
+
+    def test_max_per_code(self) -> None:
+        logger.max_per_code = 2
+        for i in range(5):
+            logger.error(MessageCodes.E002, f"Texture 'tree_{i}.png' is missing", None)
+        logger.error(MessageCodes.E002, "Texture 'tree_0.png' is missing", None)
+        logger.error(MessageCodes.E004, "tree has no vertical quad", None)
+
+        self.assertEqual(
+            [(msg.msg_content, msg.count) for msg in logger.errors],
+            [
+                ("Texture 'tree_0.png' is missing", 2),
+                ("Texture 'tree_1.png' is missing", 1),
+                ("tree has no vertical quad", 1),
+            ],
+        )
+        self.assertEqual(logger.dropped_counts, {MessageCodes.E002: 3})
+
+        logger.warn_dropped()
+        self.assertEqual(
+            [msg.msg_content for msg in logger.warnings],
+            ["3 more E002 messages were not logged, fix the ones above first"],
+        )
+
+    def test_debug_messages_not_capped(self) -> None:
+        logger.reset(transports=[self.console], msg_types=list(MessageTypes))
+        for i in range(logger.max_per_code + 50):
+            logger.debug(
+                MessageCodes.D001,
+                f"tree_{i} is COMPLEX",
+                None,
+                category=MessageCategories.TREE,
+            )
+        self.assertEqual(logger.count(MessageTypes.DEBUG), logger.max_per_code + 50)
+        self.assertEqual(logger.dropped_counts, {})
+        logger.warn_dropped()
+        self.assertEqual(logger.warnings, [])
+
+
+runTestCases([TestMessageDeduplication])
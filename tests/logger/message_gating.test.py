@@ -0,0 +1,95 @@
+import os
+
+import bpy
+
+import io_scene_xplane_for
+import tests
+from io_scene_xplane_for.forest_logger import (
+    ForestLogger,
+    MessageCategories,
+    MessageCodes,
+    MessageTypes,
+    logger,
+)
+from tests import ForestTestCase, runTestCases
+
+_dirname = os.path.dirname(__file__)
+
+
+class TestMessageGating(tests.ForestTestCase):
+    def setUp(self):
+        super().setUp()
+        self.logged = []
+
+    def tearDown(self):
+        logger.reset(transports=[ForestLogger.ConsoleTransport()])
+
+    def log_one_of_each(self) -> None:
+        logger.debug(
+            MessageCodes.D001,
+            "tree_leaves is COMPLEX",
+            None,
+            category=MessageCategories.TREE,
+        )
+        logger.debug(
+            MessageCodes.D002,
+            "Collecting leaves",
+            None,
+            category=MessageCategories.MESH,
+        )
+        logger.info(MessageCodes.I000, "Not writing 'forest.for'", None)
+        logger.warn(MessageCodes.W000, "Cache folder is read only", None)
+        logger.error(MessageCodes.E004, "tree has no vertical quad", None)
+
+    def logged_codes(self):
+        return [msg.msg_code.name for msg in self.logged]
+
+    def test_debug_is_dropped_by_default(self) -> None:
+        logger.reset(transports=[self.logged.append])
+        self.log_one_of_each()
+        self.assertEqual(self.logged_codes(), ["I000", "W000", "E004"])
+        self.assertFalse(logger.is_enabled_for(MessageTypes.DEBUG))
+
+    def test_types(self) -> None:
+        logger.reset(
+            transports=[self.logged.append],
+            msg_types=[MessageTypes.DEBUG, MessageTypes.WARNING],
+        )
+        self.log_one_of_each()
+        # Errors are always kept
+        self.assertEqual(self.logged_codes(), ["D001", "D002", "W000", "E004"])
+
+    def test_categories(self) -> None:
+        logger.reset(
+            transports=[self.logged.append],
+            msg_types=list(MessageTypes),
+            msg_categories=[MessageCategories.MESH],
+        )
+        self.log_one_of_each()
+        self.assertEqual(self.logged_codes(), ["D002", "E004"])
+        self.assertTrue(
+            logger.is_enabled_for(MessageTypes.ERROR, MessageCategories.TREE)
+        )
+        self.assertFalse(
+            logger.is_enabled_for(MessageTypes.DEBUG, MessageCategories.TREE)
+        )
+
+    def test_lazy_content(self) -> None:
+        def fail() -> str:
+            raise AssertionError("Formatted a message that wasn't kept")
+
+        logger.reset(transports=[self.logged.append])
+        logger.debug(MessageCodes.D000, fail, None, category=MessageCategories.TREE)
+        self.assertEqual(self.logged, [])
+
+        logger.reset(transports=[self.logged.append], msg_types=list(MessageTypes))
+        logger.debug(
+            MessageCodes.D000,
+            lambda: "Handling tree",
+            None,
+            category=MessageCategories.TREE,
+        )
+        self.assertEqual([msg.msg_content for msg in self.logged], ["Handling tree"])
+
+
+runTestCases([TestMessageGating])
@@ -0,0 +1,44 @@
+import os
+
+import bpy
+
+import io_scene_xplane_for
+import tests
+from io_scene_xplane_for import forest_context
+from io_scene_xplane_for.forest_logger import MessageCodes, logger
+from tests import ForestTestCase, runTestCases
+
+_dirname = os.path.dirname(__file__)
+
+
+class TestMissingTextureReportedOnce(tests.ForestTestCase):
+    def test_missing_texture_reported_once(self) -> None:
+        self.useLogger()
+        trees = [bpy.data.objects.new(f"tree_{i}", None) for i in range(3)]
+        texture_paths = (
+            "//missing_texture.png",
+            # The same file, written differently
+            "//textures/../missing_texture.png",
+        )
+        images_before = len(bpy.data.images)
+
+        with forest_context.ExportContext() as export_context:
+            for texture_path in texture_paths:
+                for tree in trees:
+                    self.assertIsNone(
+                        export_context.get_texture_size(texture_path, tree)
+                    )
+                    self.assertIsNone(
+                        export_context.get_texture_image(texture_path, tree)
+                    )
+
+        self.assertEqual([m.msg_code for m in logger.errors], [MessageCodes.E012])
+        # Reported once, not logged again and collapsed into one message
+        self.assertEqual(logger.errors[0].count, 1)
+        self.assertIs(logger.errors[0].problem_datablock, trees[0])
+        # The image made to look for the file was removed again
+        self.assertEqual(len(bpy.data.images), images_before)
+        logger.reset()
+
+
+runTestCases([TestMissingTextureReportedOnce])
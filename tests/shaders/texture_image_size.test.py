@@ -0,0 +1,76 @@
+import os
+import shutil
+import struct
+
+import bpy
+
+import io_scene_xplane_for
+import tests
+from io_scene_xplane_for import forest_images
+from tests import ForestTestCase, get_tests_folder, get_tmp_folder, runTestCases
+
+_dirname = os.path.dirname(__file__)
+
+
+def _make_dds_header(width: int, height: int) -> bytes:
+    """The magic and 124 byte DDS_HEADER of a DXT5 texture, no pixels"""
+    # dwSize, dwFlags, dwHeight, dwWidth, dwPitchOrLinearSize, dwDepth, dwMipMapCount
+    header = struct.pack("<7I", 124, 0x1007, height, width, width * height, 0, 1)
+    return b"DDS " + header.ljust(124, b"\0")
+
+
+class TestTextureImageSize(tests.ForestTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = os.path.join(get_tmp_folder(), "texture_image_size")
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+
+    def write_tmp_file(self, file_name: str, content: bytes) -> str:
+        path = os.path.join(self.tmp_dir, file_name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_png_sizes(self) -> None:
+        for file_name in ("tri_pyr_tex.png", "y_quad_test.png"):
+            with self.subTest(file_name=file_name):
+                self.assertEqual(
+                    forest_images.get_image_size(
+                        os.path.join(get_tests_folder(), "textures", file_name)
+                    ),
+                    (512, 512),
+                )
+
+    def test_dds_size(self) -> None:
+        path = self.write_tmp_file("tree.dds", _make_dds_header(1024, 256))
+        self.assertEqual(forest_images.get_image_size(path), (1024, 256))
+
+        # A changed file isn't answered from the cache
+        self.write_tmp_file("tree.dds", _make_dds_header(64, 128))
+        os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+        self.assertEqual(forest_images.get_image_size(path), (64, 128))
+
+    def test_unreadable_images(self) -> None:
+        with open(
+            os.path.join(get_tests_folder(), "textures", "y_quad_test.png"), "rb"
+        ) as f:
+            png = f.read()
+        for file_name, content in (
+            ("truncated.png", png[:20]),
+            ("truncated.dds", _make_dds_header(512, 512)[:16]),
+            ("empty.png", b""),
+            ("not_an_image.png", b"Just some text, not an image at all"),
+            ("zero_width.dds", _make_dds_header(0, 512)),
+        ):
+            with self.subTest(file_name=file_name):
+                path = self.write_tmp_file(file_name, content)
+                self.assertIsNone(forest_images.get_image_size(path))
+
+        self.assertIsNone(
+            forest_images.get_image_size(os.path.join(self.tmp_dir, "missing.png"))
+        )
+        self.assertIsNone(forest_images.get_image_size(self.tmp_dir))
+
+
+runTestCases([TestTextureImageSize])
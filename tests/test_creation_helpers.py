@@ -20,9 +20,10 @@ from collections import namedtuple
 from typing import *
 
 import bpy
+import numpy
 from mathutils import Euler, Quaternion, Vector
 
-from io_scene_xplane_for import forest_helpers
+from io_scene_xplane_for import forest_helpers, forest_ir
 from io_scene_xplane_for.forest_helpers import ExportableRoot, PotentialRoot
 #from io_scene_xplane_for.forest_constants
 from io_scene_xplane_for.forest_logger import ForestLogger, logger
@@ -372,6 +373,78 @@ def create_datablock_light(
     return ob
 
 
+def create_forest_ir(file_name: str, vertex_count: int = 3) -> forest_ir.ForestIR:
+    """
+    Creates a ForestIR of one tree using one mesh of vertex_count vertices,
+    for testing forest_writer without a Blender scene
+    """
+    shader = forest_ir.ShaderIR(
+        texture_path="//tex/tree.png",
+        texture_path_normal="",
+        texture_path_normal_ratio=1.0,
+        texture_path_weather="",
+        has_luma_values=False,
+        luma_values=(0.0, 0.0, 0.0, 0.0),
+        blend_mode="NO_BLEND",
+        no_blend_level=0.5,
+        blend_hash_level=0.5,
+        has_specular=False,
+        specular=0.0,
+        has_bump_level=False,
+        bump_level=0.0,
+        no_shadow=False,
+        shadow_blend=False,
+        normal_mode="NONE",
+    )
+    header = forest_ir.HeaderIR(
+        shader_2D=shader,
+        shader_3D=shader,
+        has_seasons=False,
+        has_max_lod=False,
+        max_lod=0,
+        scale_x=512,
+        scale_y=512,
+        spacing=(10.0, 10.0),
+        randomness=(1.0, 1.0),
+        cast_shadow=True,
+        perlin_density=None,
+        perlin_choice=None,
+        perlin_height=None,
+    )
+    mesh_name = file_name + "_mesh"
+    vertices = numpy.zeros((vertex_count, 11), dtype=numpy.float32)
+    vertices[:, 0] = numpy.arange(vertex_count)
+    mesh = forest_ir.MeshIR(
+        name=mesh_name,
+        lod_near=0,
+        lod_far=500,
+        wind_bend_ratio=1.0,
+        branch_stiffness=1.0,
+        wind_speed=10.0,
+        no_shadow=False,
+        vertices=vertices,
+        indices=numpy.arange(vertex_count, dtype=numpy.int32),
+    )
+    tree = forest_ir.TreeIR(
+        vert_info=forest_ir.TreeStruct(0, 0, 256, 512, 128, 100, 8, 10, 2, 0, file_name),
+        horz_info=None,
+        use_custom_lod=False,
+        custom_lod=0,
+        tree_group=0,
+        mesh_names=[mesh_name],
+    )
+    return forest_ir.ForestIR(
+        file_name=file_name,
+        header=header,
+        meshes=[mesh],
+        trees=[tree],
+        trees_by_layer={0: [tree]},
+        trees_by_layer_and_group={(0, 0): [tree]},
+        groups_weight=(100, 0, 0, 0),
+        skip_surfaces=[],
+    )
+
+
 def create_image_from_disk(
     filename: str, filepath: str = "//tex/{}"
 ) -> bpy.types.Image:
@@ -405,6 +478,53 @@ def create_material_default() -> bpy.types.Material:
     return create_material("Material")
 
 
+def create_object(
+    name: str,
+    data: Optional[bpy.types.ID],
+    parent: Optional[bpy.types.Object] = None,
+    rotation_z: float = 0,
+) -> bpy.types.Object:
+    """
+    Creates an object of data (an empty if None) in the scene's collection,
+    parented to parent and rotated rotation_z degrees around Z.
+    Objects made from the same data are linked duplicates
+    """
+    ob = bpy.data.objects.new(name, data)
+    set_collection(ob, bpy.context.scene.collection)
+    ob.parent = parent
+    ob.rotation_euler.z = math.radians(rotation_z)
+    return ob
+
+
+def create_quad_mesh(
+    name: str,
+    vertices: Sequence[Tuple[float, float, float]],
+    material: Optional[bpy.types.Material] = None,
+) -> bpy.types.Mesh:
+    """
+    Creates a mesh of one quad from 4 vertices, in bottom left, bottom right,
+    top right, top left order, with UVs covering the whole texture.
+    Its edges are in the same order, starting with the bottom one
+    """
+    assert len(vertices) == 4
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(vertices, [(0, 1), (1, 2), (2, 3), (3, 0)], [(0, 1, 2, 3)])
+    uv_layer = mesh.uv_layers.new()
+    for uv_loop, uv in zip(uv_layer.data, ((0, 0), (1, 0), (1, 1), (0, 1))):
+        uv_loop.uv = uv
+    if material:
+        mesh.materials.append(material)
+    mesh.update()
+    return mesh
+
+
+def create_tree_material(name: str, texture_path: str) -> bpy.types.Material:
+    """Creates a material whose .for texture is texture_path"""
+    material = create_material(name)
+    material.xplane_for.texture_path = texture_path
+    return material
+
+
 def create_scene(name: str) -> bpy.types.Scene:
     try:
         return bpy.data.scenes[name]
@@ -518,6 +638,7 @@ def lookup_potential_root_from_name(name: str) -> PotentialRoot:
 def make_root_exportable(
     potential_root: Union[PotentialRoot, str],
     view_layer: Optional[bpy.types.ViewLayer] = None,
+    visibility_index: Optional[forest_helpers.VisibilityIndex] = None,
 ) -> ExportableRoot:
     """
     Makes a root, as given or as found by it's name from collections then root objects,
@@ -526,16 +647,13 @@ def make_root_exportable(
     Returns that changed ExportableRoot
     """
     view_layer = view_layer or bpy.context.scene.view_layers[0]
+    visibility_index = visibility_index or forest_helpers.VisibilityIndex(view_layer)
     if isinstance(potential_root, str):
         potential_root = lookup_potential_root_from_name(potential_root)
 
     if isinstance(potential_root, bpy.types.Collection):
         # This is actually talking about "Visibile In Viewport" - the little eyeball
-        all_layer_collections = {
-            lc.name: lc
-            for lc in forest_helpers.get_layer_collections_in_view_layer(view_layer)
-        }
-        all_layer_collections[potential_root.name].hide_viewport = False
+        visibility_index.get_layer_collection(potential_root).hide_viewport = False
     else:
         assert False, "How did we get here?!"
 
@@ -549,6 +667,7 @@ def make_root_unexportable(
     view_layer: Optional[bpy.types.ViewLayer] = None,
     hide_viewport: bool = False,
     disable_viewport: bool = False,
+    visibility_index: Optional[forest_helpers.VisibilityIndex] = None,
 ) -> ExportableRoot:
     """
     Makes a root, unexportable, and optionally, some type of
@@ -556,16 +675,13 @@ def make_root_unexportable(
     minimum - turning off exportablity
     """
     view_layer = view_layer or bpy.context.scene.view_layers[0]
+    visibility_index = visibility_index or forest_helpers.VisibilityIndex(view_layer)
     if isinstance(exportable_root, str):
         exportable_root = lookup_potential_root_from_name(exportable_root)
 
     if isinstance(exportable_root, bpy.types.Collection):
         # This is actually talking about "Visible In Viewport" - the little eyeball
-        all_layer_collections = {
-            lc.name: lc
-            for lc in forest_helpers.get_layer_collections_in_view_layer(view_layer)
-        }
-        all_layer_collections[exportable_root.name].hide_viewport = True
+        visibility_index.get_layer_collection(exportable_root).hide_viewport = True
     else:
         assert False, "How did we get here?!"
 
@@ -0,0 +1,58 @@
+import os
+
+import bpy
+
+import io_scene_xplane_for
+import tests
+from io_scene_xplane_for import forest_context, forest_tree
+from tests import ForestTestCase, get_tests_folder, runTestCases, test_creation_helpers
+
+_dirname = os.path.dirname(__file__)
+
+
+class TestLinkedDuplicateClassification(tests.ForestTestCase):
+    def setUp(self):
+        super().setUp()
+        test_creation_helpers.delete_everything()
+        material = test_creation_helpers.create_tree_material(
+            "tree", os.path.join(get_tests_folder(), "textures", "y_quad_test.png")
+        )
+        # Straight up when not rotated, since _is_vertical looks along X.
+        # Turned 90 degrees it's only leaning
+        leaning = test_creation_helpers.create_quad_mesh(
+            "leaning", [(0, 0, 0), (1, 0, 0), (1, 1, 2), (0, 1, 2)], material
+        )
+        upright = test_creation_helpers.create_quad_mesh(
+            "upright", [(0, 0, 0), (1, 0, 0), (1, 0, 2), (0, 0, 2)], material
+        )
+
+        self.tree_0 = test_creation_helpers.create_object("tree_0", None)
+        test_creation_helpers.create_object("tree_0_leaning", leaning, self.tree_0)
+        self.tree_90 = test_creation_helpers.create_object("tree_90", None)
+        test_creation_helpers.create_object(
+            "tree_90_leaning", leaning, self.tree_90, rotation_z=90
+        )
+        test_creation_helpers.create_object("tree_90_upright", upright, self.tree_90)
+        bpy.context.view_layer.update()
+
+    def test_rotated_linked_duplicates(self) -> None:
+        def classify(tree_containers, export_context):
+            trees = [
+                forest_tree.ForestTree(tree_container, 1, export_context)
+                for tree_container in tree_containers
+            ]
+            return [(tree.vert_quad.name, tree.vert_info.quads) for tree in trees]
+
+        with forest_context.ExportContext() as export_context:
+            shared = classify([self.tree_0, self.tree_90], export_context)
+
+        separate = []
+        for tree_container in (self.tree_0, self.tree_90):
+            with forest_context.ExportContext() as export_context:
+                separate.extend(classify([tree_container], export_context))
+
+        self.assertEqual(shared, [("tree_0_leaning", 1), ("tree_90_upright", 1)])
+        self.assertEqual(shared, separate)
+
+
+runTestCases([TestLinkedDuplicateClassification])
@@ -0,0 +1,72 @@
+import os
+
+import bpy
+
+import io_scene_xplane_for
+import tests
+from io_scene_xplane_for import forest_context, forest_tree
+from tests import ForestTestCase, get_tests_folder, runTestCases, test_creation_helpers
+
+_dirname = os.path.dirname(__file__)
+
+
+class TestNestedTreeChildren(tests.ForestTestCase):
+    def setUp(self):
+        super().setUp()
+        test_creation_helpers.delete_everything()
+        material = test_creation_helpers.create_tree_material(
+            "tree", os.path.join(get_tests_folder(), "textures", "y_quad_test.png")
+        )
+        quad = test_creation_helpers.create_quad_mesh(
+            "quad", [(-1, 0, 0), (1, 0, 0), (1, 0, 4), (-1, 0, 4)], material
+        )
+        pyramid = bpy.data.meshes.new("pyramid")
+        pyramid.from_pydata(
+            [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)],
+            [],
+            [(0, 2, 1), (0, 1, 3), (1, 2, 3), (2, 0, 3)],
+        )
+        pyramid.materials.append(material)
+        leaves = bpy.data.meshes.new("leaves")
+        leaves.from_pydata(
+            [(0, 0, 2), (1, 0, 2), (0, 1, 2), (0, 0, 3)],
+            [],
+            [(0, 2, 1), (0, 1, 3), (1, 2, 3), (2, 0, 3)],
+        )
+        leaves.materials.append(material)
+
+        # tree
+        # - branch (an empty)
+        #   - branch_leaves
+        #   - branch_quad
+        # - trunk
+        self.tree = test_creation_helpers.create_object("tree", None)
+        branch = test_creation_helpers.create_object("branch", None, self.tree)
+        test_creation_helpers.create_object("branch_leaves", leaves, branch)
+        test_creation_helpers.create_object("branch_quad", quad, branch)
+        test_creation_helpers.create_object("trunk", pyramid, self.tree)
+        bpy.context.view_layer.update()
+
+    def test_grandchildren_are_classified(self) -> None:
+        with forest_context.ExportContext() as export_context:
+            self.assertEqual(
+                [
+                    child.name
+                    for child in export_context.children_index.get_descendants(
+                        self.tree
+                    )
+                ],
+                ["branch", "trunk", "branch_leaves", "branch_quad"],
+            )
+            tree = forest_tree.ForestTree(self.tree, 1, export_context)
+
+        # Objects under an empty (or armature) count as the tree's own
+        self.assertEqual(tree.vert_quad.name, "branch_quad")
+        self.assertEqual(tree.vert_info.quads, 1)
+        self.assertEqual(
+            [obj.name for obj in tree.complex_objects], ["trunk", "branch_leaves"]
+        )
+        self.assertEqual(tree.to_ir().mesh_names, ["leaves", "pyramid"])
+
+
+runTestCases([TestNestedTreeChildren])